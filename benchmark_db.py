@@ -0,0 +1,102 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session
+
+from binance_trade_bot.config import Config
+from binance_trade_bot.database import Database
+from binance_trade_bot.logger import Logger
+from binance_trade_bot.models import Coin, CoinValue
+
+
+class LegacyDatabase(Database):
+    """
+    The database layer as it was before tuning: default engine, a new scoped session for every context
+    """
+
+    def _create_engine(self, uri):
+        return create_engine(uri)
+
+    @contextmanager
+    def db_session(self):
+        session = scoped_session(self.SessionMaker)
+        yield session
+        session.commit()
+        session.close()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def start_readers(database_class, logger: Logger, config: Config, uri: str, count: int):
+    """
+    Start threads polling the value history like the API server does, each from its own engine. Returns the
+    event stopping them, the threads and their read counts.
+    """
+    stop = threading.Event()
+    reads = [0] * count
+
+    def read(reader):
+        reader_db = database_class(logger, config, uri)
+        while not stop.is_set():
+            with reader_db.db_session() as session:
+                session.query(CoinValue).order_by(CoinValue.datetime.desc()).limit(100).all()
+            reads[reader] += 1
+
+    threads = [threading.Thread(target=read, args=(reader,)) for reader in range(count)]
+    for thread in threads:
+        thread.start()
+    return stop, threads, reads
+
+
+def time_commits(db: Database, commits: int):
+    """
+    Commit a coin value per transaction, returns the latency of each commit and the total duration
+    """
+    latencies = []
+    start = time.perf_counter()
+    for commit in range(commits):
+        commit_start = time.perf_counter()
+        with db.db_session() as session:
+            coin = session.query(Coin).get("ADA")
+            session.add(CoinValue(coin, commit, 1.0, 0.00001))
+        latencies.append(time.perf_counter() - commit_start)
+    return latencies, time.perf_counter() - start
+
+
+def run(database_class, path: str, commits: int, readers: int):
+    uri = f"sqlite:///{path}"
+    logger = Logger("benchmark", False)
+    config = Config()
+    db = database_class(logger, config, uri)
+    db.create_database()
+    db.set_coins(["ADA", "XLM"])
+
+    stop, threads, reads = start_readers(database_class, logger, config, uri, readers)
+    latencies, duration = time_commits(db, commits)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{database_class.__name__}:")
+    print(f"  commits:  {commits / duration:.0f}/s")
+    print(f"  latency:  p50 {percentile(latencies, 0.5) * 1000:.2f}ms, p99 {percentile(latencies, 0.99) * 1000:.2f}ms")
+    print(f"  reads:    {sum(reads) / duration:.0f}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the commit throughput of the database layer")
+    parser.add_argument("--commits", type=int, default=2000, help="Number of small transactions to commit")
+    parser.add_argument("--readers", type=int, default=1, help="Number of threads reading concurrently")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for database in (LegacyDatabase, Database):
+            run(database, os.path.join(tmp_dir, f"{database.__name__}.db"), args.commits, args.readers)
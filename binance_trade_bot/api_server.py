@@ -149,5 +149,13 @@ def handle_my_custom_event(json):
     emit("update", json, namespace="/frontend", broadcast=True)
 
 
+@socketio.on("updates", namespace="/backend")
+def handle_updates(batch):
+    # Batches sent by the bot's update publisher, the frontend still gets one update per row
+    for table_updates in batch:
+        for data in table_updates["data"]:
+            emit("update", {"table": table_updates["table"], "data": data}, namespace="/frontend", broadcast=True)
+
+
 if __name__ == "__main__":
     socketio.run(app, debug=True, port=5123)
@@ -1,13 +1,15 @@
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict
 
-from sqlalchemy.orm import Session
+import numpy as np
 
 from .binance_api_manager import BinanceAPIManager
 from .config import Config
 from .database import Database
 from .logger import Logger
 from .models import Coin, CoinValue, Pair
+from .ratio_engine import RatioEngine
 
 
 class AutoTrader:
@@ -22,14 +24,21 @@ class AutoTrader:
         self.db = database
         self.logger = logger
         self.config = config
+        self.ratios = RatioEngine(config)
 
     def initialize(self):
+        self.ratios.load(self.db.get_coins(), self.db.get_pairs())
         self.initialize_trade_thresholds()
 
     def transaction_through_bridge(self, pair: Pair):
         """
         Jump from the source coin to the destination coin through bridge coin
+
+        The buy order is prepared before the sell and placed as soon as the sell is filled, sized from the
+        bridge proceeds and commission reported by the fills instead of waiting for the account balance to be
+        refreshed.
         """
+        jump_start = time.monotonic()
         can_sell = False
         balance = self.manager.get_currency_balance(pair.from_coin.symbol)
         from_coin_price = self.manager.get_ticker_price(pair.from_coin + self.config.BRIDGE)
@@ -41,14 +50,33 @@ class AutoTrader:
         else:
             self.logger.info("Skipping sell")
 
-        if can_sell and self.manager.sell_alt(pair.from_coin, self.config.BRIDGE) is None:
-            self.logger.info("Couldn't sell, going back to scouting mode...")
-            return None
+        buy_plan = self.manager.prepare_buy(pair.to_coin, self.config.BRIDGE)
+        bridge_balance = None
+        if can_sell:
+            bridge_balance = self.manager.get_currency_balance(self.config.BRIDGE.symbol)
+
+            sell_order = self.manager.sell_alt(pair.from_coin, self.config.BRIDGE)
+            if sell_order is None:
+                self.logger.info("Couldn't sell, going back to scouting mode...")
+                return None
+
+            bridge_balance += sell_order.cumulative_quote_qty - sell_order.commission(self.config.BRIDGE.symbol)
 
-        result = self.manager.buy_alt(pair.to_coin, self.config.BRIDGE)
+        result = self.manager.buy_alt(pair.to_coin, self.config.BRIDGE, bridge_balance, jump_start, buy_plan)
         if result is not None:
             self.db.set_current_coin(pair.to_coin)
             self.update_trade_threshold(pair.to_coin, result.price)
+            # The jump is only done once the new current coin is on disk, a restart must not resume from the
+            # coin we just sold
+            try:
+                self.db.barrier()
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error(
+                    f"Jumped from {pair.from_coin} to {pair.to_coin} but couldn't save it, a restart would resume "
+                    f"from {pair.from_coin}: {e}"
+                )
+                return result
+            self.logger.info(f"Jump from {pair.from_coin} to {pair.to_coin} took {time.monotonic() - jump_start:.3f}s")
             return result
 
         self.logger.info("Couldn't buy, going back to scouting mode...")
@@ -63,39 +91,39 @@ class AutoTrader:
             self.logger.info(f"Skipping update... current coin {coin + self.config.BRIDGE} not found")
             return
 
-        session: Session
-        with self.db.db_session() as session:
-            for pair in session.query(Pair).filter(Pair.to_coin == coin):
-                from_coin_price = self.manager.get_ticker_price(pair.from_coin + self.config.BRIDGE)
+        for pair in self.db.get_pairs_to(coin, only_enabled=False):
+            from_coin_price = self.manager.get_ticker_price(pair.from_coin + self.config.BRIDGE)
 
-                if from_coin_price is None:
-                    self.logger.info(f"Skipping update for coin {pair.from_coin + self.config.BRIDGE} not found")
-                    continue
+            if from_coin_price is None:
+                self.logger.info(f"Skipping update for coin {pair.from_coin + self.config.BRIDGE} not found")
+                continue
 
-                pair.ratio = from_coin_price / coin_price
+            self._set_ratio(pair, from_coin_price / coin_price)
 
     def initialize_trade_thresholds(self):
         """
         Initialize the buying threshold of all the coins for trading between them
         """
-        session: Session
-        with self.db.db_session() as session:
-            for pair in session.query(Pair).filter(Pair.ratio.is_(None)).all():
-                if not pair.from_coin.enabled or not pair.to_coin.enabled:
-                    continue
-                self.logger.info(f"Initializing {pair.from_coin} vs {pair.to_coin}")
+        for pair in self.db.get_pairs():
+            if pair.ratio is not None:
+                continue
+            self.logger.info(f"Initializing {pair.from_coin} vs {pair.to_coin}")
 
-                from_coin_price = self.manager.get_ticker_price(pair.from_coin + self.config.BRIDGE)
-                if from_coin_price is None:
-                    self.logger.info(f"Skipping initializing {pair.from_coin + self.config.BRIDGE}, symbol not found")
-                    continue
+            from_coin_price = self.manager.get_ticker_price(pair.from_coin + self.config.BRIDGE)
+            if from_coin_price is None:
+                self.logger.info(f"Skipping initializing {pair.from_coin + self.config.BRIDGE}, symbol not found")
+                continue
 
-                to_coin_price = self.manager.get_ticker_price(pair.to_coin + self.config.BRIDGE)
-                if to_coin_price is None:
-                    self.logger.info(f"Skipping initializing {pair.to_coin + self.config.BRIDGE}, symbol not found")
-                    continue
+            to_coin_price = self.manager.get_ticker_price(pair.to_coin + self.config.BRIDGE)
+            if to_coin_price is None:
+                self.logger.info(f"Skipping initializing {pair.to_coin + self.config.BRIDGE}, symbol not found")
+                continue
+
+            self._set_ratio(pair, from_coin_price / to_coin_price)
 
-                pair.ratio = from_coin_price / to_coin_price
+    def _set_ratio(self, pair: Pair, ratio: float):
+        self.db.set_pair_ratio(pair, ratio)
+        self.ratios.set_ratio(pair.from_coin_id, pair.to_coin_id, ratio)
 
     def scout(self):
         """
@@ -103,51 +131,71 @@ class AutoTrader:
         """
         raise NotImplementedError()
 
-    def _get_ratios(self, coin: Coin, coin_price):
+    def _update_prices(self):
         """
-        Given a coin, get the current price ratio for every other enabled coin
+        Refresh the price vector of the ratio engine, stale prices are left out
         """
-        ratio_dict: Dict[Pair, float] = {}
+        self.ratios.update_prices(
+            lambda symbols: self.manager.get_ticker_prices(symbols, max_age=self.config.MAX_PRICE_AGE)
+        )
 
-        for pair in self.db.get_pairs_from(coin):
-            optional_coin_price = self.manager.get_ticker_price(pair.to_coin + self.config.BRIDGE)
+    def _scout_ratios(self, coin: Coin, coin_price: float):
+        """
+        Refresh the ratio engine and compute the scouting ratios from the given coin to every other coin
+        """
+        self._update_prices()
+        if self.config.MAX_PRICE_AGE:
+            price_age = self.manager.get_ticker_price_age(coin + self.config.BRIDGE)
+            if price_age > self.config.MAX_PRICE_AGE:
+                self.logger.warning(
+                    f"Skipping scouting... price of {coin + self.config.BRIDGE} is {price_age:.0f}s old", False
+                )
+                return None
+
+        self.ratios.update_fees(self.manager.get_fee, [coin.symbol])
+        ratios = self.ratios.scout_from(coin.symbol, coin_price)
+        if ratios is None:
+            return None
+
+        for j, pair in self.ratios.pairs_from(coin.symbol):
+            optional_coin_price = self.ratios.prices[j]
 
-            if optional_coin_price is None:
-                self.logger.info(f"Skipping scouting... optional coin {pair.to_coin + self.config.BRIDGE} not found")
+            if np.isnan(optional_coin_price):
+                self.logger.info(
+                    f"Skipping scouting... optional coin {pair.to_coin + self.config.BRIDGE} not found or stale"
+                )
                 continue
 
-            self.db.log_scout(pair, pair.ratio, coin_price, optional_coin_price)
+            self.db.log_scout(pair, pair.ratio, coin_price, float(optional_coin_price))
+        self.db.flush_scout_history()
+        return ratios
 
-            # Obtain (current coin)/(optional coin)
-            coin_opt_coin_ratio = coin_price / optional_coin_price
+    def _get_ratios(self, coin: Coin, coin_price):
+        """
+        Given a coin, get the current price ratio for every other enabled coin
+        """
+        ratio_dict: Dict[Pair, float] = {}
 
-            # Fees
-            from_fee = self.manager.get_fee(pair.from_coin, self.config.BRIDGE, True)
-            to_fee = self.manager.get_fee(pair.to_coin, self.config.BRIDGE, False)
-            transaction_fee = from_fee + to_fee - from_fee * to_fee
+        ratios = self._scout_ratios(coin, coin_price)
+        if ratios is None:
+            return ratio_dict
 
-            if self.config.USE_MARGIN == "yes":
-                ratio_dict[pair] = (
-                    (1 - transaction_fee) * coin_opt_coin_ratio / pair.ratio - 1 - self.config.SCOUT_MARGIN / 100
-                )
-            else:
-                ratio_dict[pair] = (
-                    coin_opt_coin_ratio - transaction_fee * self.config.SCOUT_MULTIPLIER * coin_opt_coin_ratio
-                ) - pair.ratio
+        for j, pair in self.ratios.pairs_from(coin.symbol):
+            if not np.isnan(ratios[j]):
+                ratio_dict[pair] = float(ratios[j])
         return ratio_dict
 
     def _jump_to_best_coin(self, coin: Coin, coin_price: float):
         """
         Given a coin, search for a coin to jump to
         """
-        ratio_dict = self._get_ratios(coin, coin_price)
-
-        # keep only ratios bigger than zero
-        ratio_dict = {k: v for k, v in ratio_dict.items() if v > 0}
+        ratios = self._scout_ratios(coin, coin_price)
+        if ratios is None:
+            return
 
         # if we have any viable options, pick the one with the biggest ratio
-        if ratio_dict:
-            best_pair = max(ratio_dict, key=ratio_dict.get)
+        best_pair = self.ratios.best_pair(coin.symbol, ratios)
+        if best_pair is not None:
             self.logger.info(f"Will be jumping from {coin} to {best_pair.to_coin_id}")
             self.transaction_through_bridge(best_pair)
 
@@ -157,14 +205,15 @@ class AutoTrader:
         """
         bridge_balance = self.manager.get_currency_balance(self.config.BRIDGE.symbol)
 
-        for coin in self.db.get_coins():
-            current_coin_price = self.manager.get_ticker_price(coin + self.config.BRIDGE)
+        self._update_prices()
+        self.ratios.update_fees(self.manager.get_fee, self.ratios.index)
+        ratio_matrix = self.ratios.scout_all()
 
-            if current_coin_price is None:
+        for i, coin in enumerate(self.ratios.coins):
+            if np.isnan(self.ratios.prices[i]):
                 continue
 
-            ratio_dict = self._get_ratios(coin, current_coin_price)
-            if not any(v > 0 for v in ratio_dict.values()):
+            if not np.any(ratio_matrix[i] > 0):
                 # There will only be one coin where all the ratios are negative. When we find it, buy it if we can
                 if bridge_balance > self.manager.get_min_notional(coin.symbol, self.config.BRIDGE.symbol):
                     self.logger.info(f"Will be purchasing {coin} using bridge coin")
@@ -178,15 +227,12 @@ class AutoTrader:
         """
         now = datetime.now()
 
-        session: Session
-        with self.db.db_session() as session:
-            coins: List[Coin] = session.query(Coin).all()
-            for coin in coins:
-                balance = self.manager.get_currency_balance(coin.symbol)
-                if balance == 0:
-                    continue
-                usd_value = self.manager.get_ticker_price(coin + "USDT")
-                btc_value = self.manager.get_ticker_price(coin + "BTC")
-                cv = CoinValue(coin, balance, usd_value, btc_value, datetime=now)
-                session.add(cv)
-                self.db.send_update(cv)
+        coin_values = []
+        for coin in self.db.get_coins(only_enabled=False):
+            balance = self.manager.get_currency_balance(coin.symbol)
+            if balance == 0:
+                continue
+            usd_value = self.manager.get_ticker_price(coin + "USDT")
+            btc_value = self.manager.get_ticker_price(coin + "BTC")
+            coin_values.append(CoinValue(coin, balance, usd_value, btc_value, datetime=now))
+        self.db.log_coin_values(coin_values)
@@ -1,8 +1,9 @@
 from collections import defaultdict
 from datetime import datetime, timedelta
 from traceback import format_exc
-from typing import Dict
+from typing import Dict, Sequence
 
+import numpy as np
 from sqlitedict import SqliteDict
 
 from .binance_api_manager import BinanceAPIManager
@@ -62,13 +63,34 @@ class MockBinanceManager(BinanceAPIManager):
             val = cache.get(key, None)
         return val
 
+    def get_ticker_prices(
+        self, ticker_symbols: Sequence[str], max_age: float = 0
+    ) -> np.ndarray:  # pylint: disable=unused-argument
+        """
+        Get ticker prices of many coins at once
+        """
+        return np.array([self.get_ticker_price(ticker_symbol) for ticker_symbol in ticker_symbols], dtype=float)
+
+    def get_ticker_price_age(self, ticker_symbol: str) -> float:  # pylint: disable=unused-argument
+        return 0.0
+
     def get_currency_balance(self, currency_symbol: str, force=False):
         """
         Get balance of a specific coin
         """
         return self.balances.get(currency_symbol, 0)
 
-    def buy_alt(self, origin_coin: Coin, target_coin: Coin):
+    def prepare_buy(self, origin_coin: Coin, target_coin: Coin):
+        return None  # Orders are priced at the historical price they are simulated at
+
+    def buy_alt(
+        self,
+        origin_coin: Coin,
+        target_coin: Coin,
+        target_balance: float = None,
+        jump_start: float = None,
+        plan=None,
+    ):  # pylint: disable=unused-argument
         origin_symbol = origin_coin.symbol
         target_symbol = target_coin.symbol
 
@@ -103,15 +125,23 @@ class MockBinanceManager(BinanceAPIManager):
 
         order_quantity = self._sell_quantity(origin_symbol, target_symbol, origin_balance)
         target_quantity = order_quantity * from_coin_price
-        self.balances[target_symbol] = self.balances.get(target_symbol, 0) + target_quantity * (
-            1 - self.get_fee(origin_coin, target_coin, True)
-        )
+        commission = target_quantity * self.get_fee(origin_coin, target_coin, True)
+        self.balances[target_symbol] = self.balances.get(target_symbol, 0) + target_quantity - commission
         self.balances[origin_symbol] -= order_quantity
         self.logger.info(
             f"Sold {origin_symbol}, balance now: {self.balances[origin_symbol]} - bridge: "
             f"{self.balances[target_symbol]}"
         )
-        return {"price": from_coin_price}
+        event = defaultdict(
+            lambda: None,
+            order_price=from_coin_price,
+            cumulative_quote_asset_transacted_quantity=target_quantity,
+            trade_id=0,
+            commission_asset=target_symbol,
+            commission_amount=commission,
+        )
+
+        return BinanceOrder(event)
 
     def collate_coins(self, target_symbol: str):
         total = 0
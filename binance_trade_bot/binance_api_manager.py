@@ -1,36 +1,75 @@
 import math
 import time
 import traceback
-from typing import Dict, Optional
+from typing import Dict, List, Mapping, Optional, Sequence
 
-from binance.client import Client
+import numpy as np
 from binance.exceptions import BinanceAPIException
 from cachetools import TTLCache, cached
 
 from .binance_stream_manager import BinanceCache, BinanceOrder, BinanceStreamManager, OrderGuard
 from .config import Config
 from .database import Database
+from .exchange_info import ExchangeInfo, SymbolInfo
 from .logger import Logger
 from .models import Coin
+from .request_scheduler import ScheduledClient, backoff_delay
+from .ticker_store import tracked_symbols
+
+# Binance error code of orders rejected for lack of funds
+INSUFFICIENT_BALANCE = -2010
+
+
+class BuyPlan:
+    """
+    The parts of a buy order that don't depend on the balance paying for it, prepared while the sell leg
+    of a jump is working so that only the quantity is left to compute once the sell is filled
+    """
+
+    def __init__(self, symbol_info: SymbolInfo, price: float, origin_balance: float):
+        self.symbol_info = symbol_info
+        self.price = price
+        self.price_s = "{:0.0{}f}".format(price, symbol_info.quote_precision)
+        self.origin_balance = origin_balance
+        self.created_at = time.monotonic()
+
+    def quantity(self, target_balance: float) -> float:
+        origin_tick = self.symbol_info.alt_tick
+        return math.floor(target_balance * 10**origin_tick / self.price) / float(10**origin_tick)
+
+    def format_quantity(self, quantity: float) -> str:
+        return "{:0.0{}f}".format(quantity, self.symbol_info.base_asset_precision)
 
 
 class BinanceAPIManager:
+    # Maximum number of seconds to block while waiting for an order update
+    ORDER_WAIT_INTERVAL = 60
+    # A buy plan older than this was prepared for a sell that took a while to fill, its price is redone
+    BUY_PLAN_MAX_AGE = 10
+
     def __init__(self, config: Config, db: Database, logger: Logger, testnet = False):
         # initializing the client class calls `ping` API endpoint, verifying the connection
-        self.binance_client = Client(
+        self.binance_client = ScheduledClient(
             config.BINANCE_API_KEY,
             config.BINANCE_API_SECRET_KEY,
             tld=config.BINANCE_TLD,
             testnet=testnet,
+            api_url=config.BINANCE_API_URL,
         )
         self.db = db
         self.logger = logger
         self.config = config
         self.testnet = testnet
 
+        self.exchange_info = ExchangeInfo(self.binance_client, logger)
+        self.exchange_info.load()
+        self.exchange_info.start_refresh()
+
         self.cache = BinanceCache()
         self.stream_manager: Optional[BinanceStreamManager] = None
         self.setup_websockets()
+        self.track_coins(config.SUPPORTED_COIN_LIST)
+        db.add_coins_listener(self.track_coins)
 
     def setup_websockets(self):
         self.stream_manager = BinanceStreamManager(
@@ -40,19 +79,30 @@ class BinanceAPIManager:
             self.logger,
         )
 
+    def track_coins(self, symbols: List[str]):
+        """
+        Track the prices of the markets of the given coins, and watch their bridge markets for scouting
+        """
+        markets = [
+            symbol for symbol in tracked_symbols(symbols, self.config.BRIDGE.symbol) if symbol in self.exchange_info
+        ]
+        self.cache.tickers.set_symbols(markets)
+        for symbol in set(self.cache.book_tickers).difference(markets):
+            self.cache.book_tickers.pop(symbol, None)
+        if self.stream_manager is not None:
+            self.stream_manager.set_markets(markets)
+            self.stream_manager.scout_trigger.watch(symbol + self.config.BRIDGE.symbol for symbol in symbols)
+
     @cached(cache=TTLCache(maxsize=1, ttl=43200))
     def get_trade_fees(self) -> Dict[str, float]:
         if not self.testnet:
-            return {ticker["symbol"]: float(ticker["takerCommission"]) for ticker in self.binance_client.get_trade_fee()}
+            return {
+                ticker["symbol"]: float(ticker["takerCommission"]) for ticker in self.binance_client.get_trade_fee()
+            }
 
 
         ## testnet does not provide trade fee API, emulating it
-        exchange_info = self.binance_client.get_exchange_info()
-        symbols = exchange_info["symbols"]
-        return {
-            symbol["symbol"]: 0.001
-            for symbol in symbols
-        }
+        return {symbol_info.symbol: 0.001 for symbol_info in self.exchange_info}
 
 
     @cached(cache=TTLCache(maxsize=1, ttl=60))
@@ -60,6 +110,13 @@ class BinanceAPIManager:
         return self.binance_client.get_bnb_burn_spot_margin()["spotBNBBurn"]
 
     def get_fee(self, origin_coin: Coin, target_coin: Coin, selling: bool):
+        fee = self.cache.fees.get(origin_coin.symbol, target_coin.symbol, selling)
+        if fee is None:
+            fee = self._compute_fee(origin_coin, target_coin, selling)
+            self.cache.fees.set(origin_coin.symbol, target_coin.symbol, selling, fee)
+        return fee
+
+    def _compute_fee(self, origin_coin: Coin, target_coin: Coin, selling: bool):
         base_fee = self.get_trade_fees()[origin_coin + target_coin]
         if not self.testnet:
             if not self.get_using_bnb_for_fees():
@@ -97,40 +154,89 @@ class BinanceAPIManager:
         """
         Get ticker price of a specific coin
         """
-        price = self.cache.ticker_values.get(ticker_symbol, None)
+        price = self.cache.tickers.get(ticker_symbol)
         if price is None and ticker_symbol not in self.cache.non_existent_tickers:
-            self.cache.ticker_values = {
+            ticker_values = {
                 ticker["symbol"]: float(ticker["price"]) for ticker in self.binance_client.get_symbol_ticker()
             }
-            self.logger.debug(f"Fetched all ticker prices: {self.cache.ticker_values}")
-            price = self.cache.ticker_values.get(ticker_symbol, None)
+            self.logger.debug(f"Fetched all ticker prices: {ticker_values}")
+            price = ticker_values.get(ticker_symbol, None)
+            if price is not None:
+                self.cache.tickers.track([ticker_symbol])
+            self.cache.tickers.update_many(ticker_values)
             if price is None:
                 self.logger.info(f"Ticker does not exist: {ticker_symbol} - will not be fetched from now on")
                 self.cache.non_existent_tickers.add(ticker_symbol)
 
         return price
 
+    def get_order_price(self, ticker_symbol: str, side: str) -> Optional[float]:
+        """
+        Get the price to place a limit order at. With order_price=book that is the best ask for a buy and
+        the best bid for a sell, so that the order fills right away, otherwise the last traded price.
+        """
+        if self.config.ORDER_PRICE == "book":
+            book = self.cache.book_tickers.get(ticker_symbol)
+            if book is None:
+                try:
+                    ticker = self.binance_client.get_orderbook_ticker(symbol=ticker_symbol)
+                    book = (float(ticker["bidPrice"]), float(ticker["askPrice"]))
+                except BinanceAPIException as e:
+                    self.logger.warning(f"Couldn't fetch order book ticker for {ticker_symbol}: {e}")
+            if book is not None:
+                bid, ask = book
+                price = ask if side == "BUY" else bid
+                if price > 0:
+                    return price
+        return self.get_ticker_price(ticker_symbol)
+
+    def get_ticker_prices(self, ticker_symbols: Sequence[str], max_age: float = 0) -> np.ndarray:
+        """
+        Get ticker prices of many coins at once, NaN for tickers that don't exist or, when `max_age` is set,
+        haven't been updated for more than `max_age` seconds
+        """
+        prices = self.cache.tickers.prices_of(ticker_symbols)
+        for i in np.flatnonzero(np.isnan(prices)):
+            price = self.get_ticker_price(ticker_symbols[i])
+            if price is not None:
+                prices[i] = price
+        if max_age:
+            stale = self.cache.tickers.ages_of(ticker_symbols) > max_age
+            if stale.any() and self.stream_manager is not None:
+                # Quiet markets may not get stream updates for a while, poll them at most once per max_age
+                self.stream_manager.refresh_tickers(max_age)
+                prices = self.cache.tickers.prices_of(ticker_symbols)
+                stale = self.cache.tickers.ages_of(ticker_symbols) > max_age
+            prices[stale] = np.nan
+        return prices
+
+    def get_ticker_price_age(self, ticker_symbol: str) -> float:
+        """
+        Get the seconds since the price of a ticker was last updated
+        """
+        return self.cache.tickers.age(ticker_symbol)
+
     def get_currency_balance(self, currency_symbol: str, force=False) -> float:
         """
         Get balance of a specific coin
         """
-        with self.cache.open_balances() as cache_balances:
-            balance = cache_balances.get(currency_symbol, None)
-            if force or balance is None:
-                cache_balances.clear()
-                cache_balances.update(
-                    {
-                        currency_balance["asset"]: float(currency_balance["free"])
-                        for currency_balance in self.binance_client.get_account()["balances"]
-                    }
-                )
-                self.logger.debug(f"Fetched all balances: {cache_balances}")
-                if currency_symbol not in cache_balances:
-                    cache_balances[currency_symbol] = 0.0
-                    return 0.0
-                return cache_balances.get(currency_symbol, 0.0)
+        balances = None if force else self.cache.balances.snapshot()
+        if balances is None:
+            balances = self._fetch_balances()
+        return balances.get(currency_symbol, 0.0)
 
-            return balance
+    def _fetch_balances(self) -> Mapping[str, float]:
+        """
+        Load all balances from the API into the cache
+        """
+        generation = self.cache.balances.generation
+        account = self.binance_client.get_account()
+        balances = {
+            currency_balance["asset"]: float(currency_balance["free"]) for currency_balance in account["balances"]
+        }
+        self.logger.debug(f"Fetched all balances: {balances}")
+        self.cache.fees.clear()
+        return self.cache.balances.load(balances, account["updateTime"], generation) or balances
 
     def retry(self, func, *args, **kwargs):
         for attempt in range(20):
@@ -140,43 +246,32 @@ class BinanceAPIManager:
                 self.logger.warning(f"Failed to Buy/Sell. Trying Again (attempt {attempt}/20)")
                 if attempt == 0:
                     self.logger.warning(traceback.format_exc())
-                time.sleep(1)
+                time.sleep(backoff_delay(attempt))
         return None
 
     def get_symbol_filter(self, origin_symbol: str, target_symbol: str, filter_type: str):
-        return next(
-            _filter
-            for _filter in self.binance_client.get_symbol_info(origin_symbol + target_symbol)["filters"]
-            if _filter["filterType"] == filter_type
-        )
+        return self.exchange_info[origin_symbol + target_symbol].filters[filter_type]
 
-    @cached(cache=TTLCache(maxsize=2000, ttl=43200))
     def get_alt_tick(self, origin_symbol: str, target_symbol: str):
-        step_size = self.get_symbol_filter(origin_symbol, target_symbol, "LOT_SIZE")["stepSize"]
-        if step_size.find("1") == 0:
-            return 1 - step_size.find(".")
-        return step_size.find("1") - 1
+        return self.exchange_info[origin_symbol + target_symbol].alt_tick
 
-    @cached(cache=TTLCache(maxsize=2000, ttl=43200))
     def get_min_notional(self, origin_symbol: str, target_symbol: str):
-        return float(self.get_symbol_filter(origin_symbol, target_symbol, "NOTIONAL")["minNotional"])
+        return self.exchange_info[origin_symbol + target_symbol].min_notional
 
     def _wait_for_order(
         self, order_id, origin_symbol: str, target_symbol: str
     ) -> Optional[BinanceOrder]:  # pylint: disable=unsubscriptable-object
-        while True:
-            order_status: BinanceOrder = self.cache.orders.get(order_id, None)
-            if order_status is not None:
-                break
-            self.logger.debug(f"Waiting for order {order_id} to be created")
-            time.sleep(1)
+        order_status: Optional[BinanceOrder] = None
+        while order_status is None:
+            order_status = self.cache.wait_for_order_update(order_id, timeout=self.ORDER_WAIT_INTERVAL)
+            if order_status is None:
+                self.logger.debug(f"Waiting for order {order_id} to be created")
 
         self.logger.debug(f"Order created: {order_status}")
 
+        errors = 0
         while order_status.status != "FILLED":
             try:
-                order_status = self.cache.orders.get(order_id, None)
-
                 self.logger.debug(f"Waiting for order {order_id} to be filled")
 
                 if self._should_cancel_order(order_status):
@@ -206,13 +301,17 @@ class BinanceAPIManager:
                     self.logger.info("Order is canceled, going back to scouting mode...")
                     return None
 
-                time.sleep(1)
+                order_status = self.cache.wait_for_order_update(
+                    order_id, order_status, self._order_wait_timeout(order_status)
+                )
             except BinanceAPIException as e:
                 self.logger.info(e)
-                time.sleep(1)
+                time.sleep(backoff_delay(errors))
+                errors += 1
             except Exception as e:  # pylint: disable=broad-except
                 self.logger.info(f"Unexpected Error: {e}")
-                time.sleep(1)
+                time.sleep(backoff_delay(errors))
+                errors += 1
 
         self.logger.debug(f"Order filled: {order_status}")
         return order_status
@@ -221,7 +320,21 @@ class BinanceAPIManager:
         self, order_id, origin_symbol: str, target_symbol: str, order_guard: OrderGuard
     ) -> Optional[BinanceOrder]:  # pylint: disable=unsubscriptable-object
         with order_guard:
-            return self._wait_for_order(order_id, origin_symbol, target_symbol)
+            try:
+                return self._wait_for_order(order_id, origin_symbol, target_symbol)
+            finally:
+                self.cache.forget_order_waiter(order_id)
+
+    def _order_wait_timeout(self, order_status: BinanceOrder) -> float:
+        """
+        How long to wait for the next update of an order before re-checking whether it should be cancelled
+        """
+        timeout = float(self.config.SELL_TIMEOUT if order_status.side == "SELL" else self.config.BUY_TIMEOUT)
+        if not timeout:
+            return self.ORDER_WAIT_INTERVAL
+        remaining = order_status.time / 1000 + timeout * 60 - time.time()
+        # Past the timeout, a partially filled buy is only cancelled once the price moved away
+        return min(max(remaining, 1), self.ORDER_WAIT_INTERVAL)
 
     def _should_cancel_order(self, order_status):
         minutes = (time.time() - order_status.time / 1000) / 60
@@ -246,8 +359,27 @@ class BinanceAPIManager:
 
         return False
 
-    def buy_alt(self, origin_coin: Coin, target_coin: Coin) -> BinanceOrder:
-        return self.retry(self._buy_alt, origin_coin, target_coin)
+    def prepare_buy(self, origin_coin: Coin, target_coin: Coin) -> BuyPlan:
+        """
+        Look up the symbol, price the order and read the current balance of the coin to buy
+        """
+        origin_symbol = origin_coin.symbol
+        target_symbol = target_coin.symbol
+        return BuyPlan(
+            self.exchange_info[origin_symbol + target_symbol],
+            self.get_order_price(origin_symbol + target_symbol, "BUY"),
+            self.get_currency_balance(origin_symbol),
+        )
+
+    def buy_alt(
+        self,
+        origin_coin: Coin,
+        target_coin: Coin,
+        target_balance: float = None,
+        jump_start: float = None,
+        plan: BuyPlan = None,
+    ) -> BinanceOrder:
+        return self.retry(self._buy_alt, origin_coin, target_coin, target_balance, jump_start, plan)
 
     def _buy_quantity(
         self,
@@ -262,46 +394,74 @@ class BinanceAPIManager:
         origin_tick = self.get_alt_tick(origin_symbol, target_symbol)
         return math.floor(target_balance * 10**origin_tick / from_coin_price) / float(10**origin_tick)
 
-    def _buy_alt(self, origin_coin: Coin, target_coin: Coin):  # pylint: disable=too-many-locals
+    def _buy_alt(
+        self,
+        origin_coin: Coin,
+        target_coin: Coin,
+        target_balance: float = None,
+        jump_start: float = None,
+        plan: BuyPlan = None,
+    ):  # pylint: disable=too-many-locals
         """
         Buy altcoin
+
+        When `target_balance` is given (e.g. the proceeds of the sell leg of a jump) it is used as is,
+        instead of reading the cached balance. `plan` is the order prepared by `prepare_buy` before the
+        sell leg, it is prepared here if missing or too old. `jump_start` is the monotonic time at which
+        the jump this buy belongs to started, used to record its latency.
         """
-        trade_log = self.db.start_trade_log(origin_coin, target_coin, False)
         origin_symbol = origin_coin.symbol
         target_symbol = target_coin.symbol
 
-        with self.cache.open_balances() as balances:
-            balances.clear()
+        if target_balance is None:
+            target_balance = self.get_currency_balance(target_symbol)
 
-        origin_balance = self.get_currency_balance(origin_symbol)
-        target_balance = self.get_currency_balance(target_symbol)
-        pair_info = self.binance_client.get_symbol_info(origin_symbol + target_symbol)
-        from_coin_price = self.get_ticker_price(origin_symbol + target_symbol)
-        from_coin_price_s = "{:0.0{}f}".format(from_coin_price, pair_info["quotePrecision"])
+        if plan is None or time.monotonic() - plan.created_at > self.BUY_PLAN_MAX_AGE:
+            plan = self.prepare_buy(origin_coin, target_coin)
 
-        order_quantity = self._buy_quantity(origin_symbol, target_symbol, target_balance, from_coin_price)
-        order_quantity_s = "{:0.0{}f}".format(order_quantity, pair_info["baseAssetPrecision"])
+        order_quantity = plan.quantity(target_balance)
+        order_quantity_s = plan.format_quantity(order_quantity)
 
         self.logger.info(f"BUY QTY {order_quantity}")
 
         # Try to buy until successful
         order = None
         order_guard = self.stream_manager.acquire_order_guard()
+        attempt = 0
         while order is None:
             try:
                 order = self.binance_client.order_limit_buy(
                     symbol=origin_symbol + target_symbol,
                     quantity=order_quantity_s,
-                    price=from_coin_price_s,
+                    price=plan.price_s,
                 )
                 self.logger.info(order)
             except BinanceAPIException as e:
                 self.logger.info(e)
-                time.sleep(1)
+                if e.code == INSUFFICIENT_BALANCE:
+                    # The balance the order was sized from was off, size it again from the exchange's
+                    target_balance = self.get_currency_balance(target_symbol, force=True)
+                    order_quantity = plan.quantity(target_balance)
+                    if order_quantity * plan.price < plan.symbol_info.min_notional:
+                        self.logger.info(f"Not enough {target_symbol} left to buy {origin_symbol}")
+                        order_guard.cancel()
+                        return None
+                    order_quantity_s = plan.format_quantity(order_quantity)
+                    self.logger.info(f"BUY QTY {order_quantity}")
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
             except Exception as e:  # pylint: disable=broad-except
                 self.logger.warning(f"Unexpected Error: {e}")
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
 
-        trade_log.set_ordered(origin_balance, target_balance, order_quantity)
+        jump_latency = None
+        if jump_start is not None:
+            jump_latency = time.monotonic() - jump_start
+            self.logger.info(f"Jump latency until buy order: {jump_latency:.3f}s")
+
+        trade_log = self.db.start_trade_log(origin_coin, target_coin, False)
+        trade_log.set_ordered(plan.origin_balance, target_balance, order_quantity, jump_latency)
 
         order_guard.set_order(origin_symbol, target_symbol, int(order["orderId"]))
         order = self.wait_for_order(order["orderId"], origin_symbol, target_symbol, order_guard)
@@ -332,18 +492,15 @@ class BinanceAPIManager:
         origin_symbol = origin_coin.symbol
         target_symbol = target_coin.symbol
 
-        with self.cache.open_balances() as balances:
-            balances.clear()
-
         origin_balance = self.get_currency_balance(origin_symbol)
         target_balance = self.get_currency_balance(target_symbol)
 
-        pair_info = self.binance_client.get_symbol_info(origin_symbol + target_symbol)
-        from_coin_price = self.get_ticker_price(origin_symbol + target_symbol)
-        from_coin_price_s = "{:0.0{}f}".format(from_coin_price, pair_info["quotePrecision"])
+        symbol_info = self.exchange_info[origin_symbol + target_symbol]
+        from_coin_price = self.get_order_price(origin_symbol + target_symbol, "SELL")
+        from_coin_price_s = "{:0.0{}f}".format(from_coin_price, symbol_info.quote_precision)
 
         order_quantity = self._sell_quantity(origin_symbol, target_symbol, origin_balance)
-        order_quantity_s = "{:0.0{}f}".format(order_quantity, pair_info["baseAssetPrecision"])
+        order_quantity_s = "{:0.0{}f}".format(order_quantity, symbol_info.base_asset_precision)
         self.logger.info(f"Selling {order_quantity} of {origin_symbol}")
 
         self.logger.info(f"Balance is {origin_balance}")
@@ -368,10 +525,6 @@ class BinanceAPIManager:
         if order is None:
             return None
 
-        new_balance = self.get_currency_balance(origin_symbol)
-        while new_balance >= origin_balance:
-            new_balance = self.get_currency_balance(origin_symbol, True)
-
         self.logger.info(f"Sold {origin_symbol}")
 
         trade_log.set_complete(order.cumulative_quote_qty)
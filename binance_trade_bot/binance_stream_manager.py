@@ -1,8 +1,11 @@
-import sys
+import queue
 import threading
 import time
-from contextlib import contextmanager
-from typing import Dict, Set, Tuple
+import traceback
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple
 
 import binance.client
 from binance.exceptions import BinanceAPIException, BinanceRequestException
@@ -10,6 +13,9 @@ from unicorn_binance_websocket_api import BinanceWebSocketApiManager
 
 from .config import Config
 from .logger import Logger
+from .request_scheduler import backoff_delay
+from .stream_recorder import StreamRecorder
+from .ticker_store import TickerStore
 
 
 class BinanceOrder:  # pylint: disable=too-few-public-methods
@@ -23,28 +29,315 @@ class BinanceOrder:  # pylint: disable=too-few-public-methods
         self.status = report["current_order_status"]
         self.price = float(report["order_price"])
         self.time = report["transaction_time"]
+        # Commission asset and amount of the fills of the order by trade id, a report only holds its own fill
+        self.fills: Dict[int, Tuple[str, float]] = {}
+        trade_id = report.get("trade_id")
+        if trade_id is not None and trade_id != -1 and report.get("commission_asset"):
+            self.fills[trade_id] = (report["commission_asset"], float(report["commission_amount"]))
+
+    def carry_over(self, previous: "BinanceOrder"):
+        """
+        Keep the fills reported by the previous states of the order
+        """
+        self.fills = {**previous.fills, **self.fills}
+
+    def commission(self, asset: str) -> float:
+        """
+        Commission paid in `asset` for the fills of the order so far
+        """
+        return sum(amount for fill_asset, amount in self.fills.values() if fill_asset == asset)
 
     def __repr__(self):
         return f"<BinanceOrder {self.event}>"
 
 
+class FeeTable:
+    """
+    Trade fees keyed by symbol and side. A fee depends on the balances of the traded assets and of BNB
+    (when BNB is used to pay for fees), so entries are dropped whenever one of those balances changes.
+    The whole table expires after `ttl` seconds so that toggling BNB burn is picked up.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._fees: Dict[Tuple[str, bool], float] = {}
+        self._assets: Dict[Tuple[str, bool], Tuple[str, str]] = {}
+        self._mutex = threading.Lock()
+        self._expires_at = 0.0
+
+    def get(self, origin_symbol: str, target_symbol: str, selling: bool) -> Optional[float]:
+        with self._mutex:
+            if time.monotonic() >= self._expires_at:
+                self._fees.clear()
+                self._assets.clear()
+                return None
+            return self._fees.get((origin_symbol + target_symbol, selling))
+
+    def set(self, origin_symbol: str, target_symbol: str, selling: bool, fee: float):
+        with self._mutex:
+            if not self._fees:
+                self._expires_at = time.monotonic() + self.ttl
+            key = (origin_symbol + target_symbol, selling)
+            self._fees[key] = fee
+            self._assets[key] = (origin_symbol, target_symbol)
+
+    def invalidate(self, assets: Iterable[str]):
+        """
+        Drop the fees that depend on the balance of any of the given assets
+        """
+        assets = set(assets)
+        if not assets:
+            return
+        with self._mutex:
+            if "BNB" in assets:
+                self._fees.clear()
+                self._assets.clear()
+                return
+            for key, symbols in list(self._assets.items()):
+                if assets.intersection(symbols):
+                    del self._fees[key]
+                    del self._assets[key]
+
+    def clear(self):
+        with self._mutex:
+            self._fees.clear()
+            self._assets.clear()
+
+
+class BalanceBook:
+    """
+    Free balance of every asset, loaded once from the REST API and then kept up to date from the
+    user data stream: `outboundAccountPosition` events set absolute balances and `balanceUpdate`
+    events apply deltas. The book has to be reloaded after a stream reconnect, or when a delta
+    reveals that events were missed.
+
+    Readers get an immutable snapshot, every update swaps in a new one, so the mutex is only held
+    while applying an update and never across network I/O.
+    """
+
+    def __init__(self):
+        self._balances: Mapping[str, float] = MappingProxyType({})
+        # Exchange time (ms) of the latest update applied to each asset
+        self._update_times: Dict[str, int] = {}
+        # Deltas received while the book is not loaded, replayed on top of the next load
+        self._pending_deltas: List[Tuple[str, float, int]] = []
+        self._mutex = threading.Lock()
+        self._synced = False
+        self.generation = 0
+
+    def snapshot(self) -> Optional[Mapping[str, float]]:  # pylint: disable=unsubscriptable-object
+        """
+        Get the current balances, None if they have to be loaded from the API first
+        """
+        if not self._synced:
+            return None
+        return self._balances
+
+    def load(self, balances: Dict[str, float], update_time: int, generation: int) -> Optional[Mapping[str, float]]:
+        """
+        Load the balances fetched from the API at `update_time`. The load is dropped if the book got
+        invalidated since `generation` was read, as the fetched balances may predate the gap.
+        Returns the new snapshot.
+        """
+        with self._mutex:
+            if generation != self.generation:
+                return None
+            loaded = dict(balances)
+            # Stream updates that arrived while the request was in flight are newer than the response
+            for asset, asset_update_time in self._update_times.items():
+                if asset_update_time > update_time:
+                    loaded[asset] = self._balances.get(asset, 0.0)
+                else:
+                    self._update_times[asset] = update_time
+            for asset, delta, delta_time in self._pending_deltas:
+                if delta_time > max(update_time, self._update_times.get(asset, 0)):
+                    loaded[asset] = loaded.get(asset, 0.0) + delta
+                    self._update_times[asset] = delta_time
+            self._pending_deltas.clear()
+            self._balances = MappingProxyType(loaded)
+            self._synced = True
+            return self._balances
+
+    def apply_position(self, positions: Iterable[Tuple[str, float]], update_time: int) -> List[str]:
+        """
+        Set absolute balances, returns the assets whose balance changed
+        """
+        changed_assets = []
+        with self._mutex:
+            balances = dict(self._balances)
+            for asset, free in positions:
+                if update_time < self._update_times.get(asset, 0):
+                    # Out of order event, a newer balance is already known
+                    continue
+                self._update_times[asset] = update_time
+                if balances.get(asset) != free:
+                    balances[asset] = free
+                    changed_assets.append(asset)
+            if changed_assets:
+                self._balances = MappingProxyType(balances)
+        return changed_assets
+
+    def apply_delta(self, asset: str, delta: float, update_time: int) -> bool:
+        """
+        Apply a balance delta, returns False if it showed that the book is out of sync
+        """
+        with self._mutex:
+            if not self._synced:
+                self._pending_deltas.append((asset, delta, update_time))
+                return True
+            if update_time <= self._update_times.get(asset, 0):
+                # Already included in a newer absolute balance
+                return True
+            balance = self._balances.get(asset, 0.0) + delta
+            if balance < 0:
+                self._invalidate()
+                return False
+            self._update_times[asset] = update_time
+            self._balances = MappingProxyType({**self._balances, asset: balance})
+            return True
+
+    def invalidate(self):
+        with self._mutex:
+            self._invalidate()
+
+    def _invalidate(self):
+        self.generation += 1
+        self._synced = False
+        self._balances = MappingProxyType({})
+        self._update_times.clear()
+        self._pending_deltas.clear()
+
+
+class OrderStore:
+    """
+    Latest state of the orders seen on the account, bounded in size. Orders are evicted once they haven't
+    been updated for `ttl` seconds, or least recently used first when there are more than `max_size` of
+    them. Orders the bot is still waiting on are pinned and never evicted.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._orders: "OrderedDict[Any, Tuple[BinanceOrder, float]]" = OrderedDict()
+        self._pins: Counter = Counter()
+        self._mutex = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    def get(self, order_id) -> Optional[BinanceOrder]:
+        with self._mutex:
+            entry = self._orders.get(order_id)
+            if entry is None:
+                return None
+            self._orders.move_to_end(order_id)
+            return entry[0]
+
+    def set(self, order: BinanceOrder):
+        now = time.monotonic()
+        with self._mutex:
+            self._orders[order.id] = (order, now)
+            self._orders.move_to_end(order.id)
+            self._evict(now)
+
+    def _evict(self, now: float):
+        # Entries are ordered from least to most recently used, stop at the first one that has to stay
+        overflow = len(self._orders) - self.max_size
+        victims = []
+        for order_id, (_, stored_at) in self._orders.items():
+            expired = now - stored_at > self.ttl
+            if not expired and overflow <= 0:
+                break
+            if order_id in self._pins:
+                continue
+            victims.append(order_id)
+            overflow -= 1
+            if expired:
+                self.expired += 1
+            else:
+                self.evicted += 1
+        for order_id in victims:
+            del self._orders[order_id]
+
+    def pin(self, order_id):
+        with self._mutex:
+            self._pins[order_id] += 1
+
+    def unpin(self, order_id):
+        with self._mutex:
+            self._pins[order_id] -= 1
+            if self._pins[order_id] <= 0:
+                del self._pins[order_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._orders), "pinned": len(self._pins), "expired": self.expired, "evicted": self.evicted}
+
+
 class BinanceCache:  # pylint: disable=too-few-public-methods
-    ticker_values: Dict[str, float] = {}
-    _balances: Dict[str, float] = {}
-    _balances_mutex: threading.Lock = threading.Lock()
+    tickers: TickerStore = TickerStore()
+    # Best bid and ask price of each subscribed symbol
+    book_tickers: Dict[str, Tuple[float, float]] = {}
+    balances: BalanceBook = BalanceBook()
     non_existent_tickers: Set[str] = set()
-    orders: Dict[str, BinanceOrder] = {}
+    orders: OrderStore = OrderStore(max_size=1000, ttl=86400)
+    _orders_mutex: threading.Lock = threading.Lock()
+    _order_waiters: Dict[str, threading.Condition] = {}
+    # Same lifetime as the cached BNB burn setting
+    fees: FeeTable = FeeTable(60)
+
+    def set_order(self, order: BinanceOrder):
+        """
+        Store the latest state of an order and wake up whoever waits for it
+        """
+        with self._orders_mutex:
+            self._set_order(order)
+
+    def set_order_if_unchanged(self, order: BinanceOrder, previous: Optional[BinanceOrder]) -> bool:
+        """
+        Store the state of an order only if its cached state is still `previous`, returns whether it was stored
+        """
+        with self._orders_mutex:
+            if self.orders.get(order.id) is not previous:
+                return False
+            self._set_order(order)
+            return True
+
+    def _set_order(self, order: BinanceOrder):
+        previous = self.orders.get(order.id)
+        if previous is not None:
+            order.carry_over(previous)
+        self.orders.set(order)
+        waiter = self._order_waiters.get(order.id)
+        if waiter is not None:
+            waiter.notify_all()
 
-    @contextmanager
-    def open_balances(self):
-        with self._balances_mutex:
-            yield self._balances
+    def wait_for_order_update(
+        self, order_id, previous: BinanceOrder = None, timeout: float = None
+    ) -> Optional[BinanceOrder]:  # pylint: disable=unsubscriptable-object
+        """
+        Block until the state of an order differs from `previous` (None waits for the order to exist) or
+        the timeout expires, and return the latest known state of the order.
+        """
+        with self._orders_mutex:
+            waiter = self._order_waiters.get(order_id)
+            if waiter is None:
+                waiter = self._order_waiters[order_id] = threading.Condition(self._orders_mutex)
+            waiter.wait_for(lambda: self.orders.get(order_id) is not previous, timeout)
+            return self.orders.get(order_id)
+
+    def forget_order_waiter(self, order_id):
+        with self._orders_mutex:
+            self._order_waiters.pop(order_id, None)
 
 
 class OrderGuard:
-    def __init__(self, pending_orders: Set[Tuple[str, int]], mutex: threading.Lock):
+    def __init__(self, pending_orders: Set[Tuple[str, int]], mutex: threading.Lock, orders: OrderStore = None):
         self.pending_orders = pending_orders
         self.mutex = mutex
+        # Pending orders are pinned in the order store so that their updates can't be evicted
+        self.orders = orders
         # lock immediately because OrderGuard
         # should be entered and put tag that shouldn't be missed
         self.mutex.acquire()
@@ -58,133 +351,380 @@ class OrderGuard:
             if self.tag is None:
                 raise Exception("OrderGuard wasn't properly set")
             self.pending_orders.add(self.tag)
+            if self.orders is not None:
+                self.orders.pin(self.tag[1])
         finally:
             self.mutex.release()
 
+    def cancel(self):
+        """
+        Release the guard when no order ended up being placed
+        """
+        self.mutex.release()
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.pending_orders.remove(self.tag)
+        if self.orders is not None:
+            self.orders.unpin(self.tag[1])
+
+
+class ScoutTrigger:
+    """
+    Wakes up the scouter as soon as the price of a watched symbol changes. Any number of updates
+    arriving before the scouter gets to run are coalesced into a single wake up.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._symbols: FrozenSet[str] = frozenset()
 
+    def watch(self, symbols: Iterable[str]):
+        self._symbols = frozenset(symbols)
+
+    def notify(self, symbol: str):
+        if symbol in self._symbols:
+            self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait until a watched price changes, returns False if the timeout expired first
+        """
+        triggered = self._event.wait(timeout)
+        self._event.clear()
+        return triggered
+
+
+class BinanceStreamManager:  # pylint: disable=too-many-instance-attributes
+    MARKET_CHANNELS = ["miniTicker", "bookTicker"]
+    # Maximum number of queued events processed in one go
+    BATCH_SIZE = 500
+    # Seconds between two reports of the processing statistics
+    STATS_INTERVAL = 60
+    # Minimum seconds between two bulk ticker refreshes
+    TICKER_REFRESH_INTERVAL = 5
+    ORDER_FETCH_WORKERS = 8
 
-class BinanceStreamManager:
     def __init__(
         self,
         cache: BinanceCache,
         config: Config,
         binance_client: binance.client.Client,
         logger: Logger,
+        connect: bool = True,
     ):
         self.cache = cache
         self.logger = logger
+        # Stream data and signals are handed over by the websocket threads, along with their arrival time
+        self._queue: "queue.Queue[Tuple[float, Optional[str], Any]]" = queue.Queue()
+        self._event_handlers: Dict[str, Callable[[dict], None]] = {
+            "executionReport": self._on_execution_report,
+            "balanceUpdate": self._on_balance_update,
+            "outboundAccountPosition": self._on_account_position,
+            "outboundAccountInfo": self._on_account_position,
+            "24hrMiniTicker": self._on_mini_ticker,
+            "bookTicker": self._on_book_ticker,
+        }
+        self._stats = {"events": 0, "batches": 0, "lag": 0.0, "max_lag": 0.0}
+        self._stats_reported_at = time.monotonic()
+        self._tickers_refreshed_at = float("-inf")
+        self._tickers_refresh_mutex = threading.Lock()
+        # REST calls filling the gaps left by reconnects, run off the stream processor thread so that events
+        # keep flowing meanwhile
+        self._reconciler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-reconciler")
+        self.binance_client = binance_client
+        self.pending_orders: Set[Tuple[str, int]] = set()
+        self.pending_orders_mutex: threading.Lock = threading.Lock()
+        self.scout_trigger = ScoutTrigger()
+        # Market streams are created by set_markets, as many as needed for the subscribed symbols
+        self._market_streams: Dict[str, Set[str]] = {}
+        self._market_streams_mutex = threading.Lock()
+
+        self.bw_api_manager: Optional[BinanceWebSocketApiManager] = None
+        self.recorder: Optional[StreamRecorder] = None
+        if not connect:
+            # Offline, events are fed through _process_stream_data, see replay.py
+            return
+        if config.STREAM_RECORD_FILE:
+            self.recorder = StreamRecorder(config.STREAM_RECORD_FILE)
+
         exchange_name = f"binance.{config.BINANCE_TLD}"
         if config.TESTNET:
             exchange_name += "-testnet"
         self.bw_api_manager = BinanceWebSocketApiManager(
             output_default="UnicornFy",
-            enable_stream_signal_buffer=True,
             exchange=exchange_name,
+            process_stream_data=self._enqueue_stream_data,
+            process_stream_signals=self._enqueue_stream_signal,
         )
-        self.bw_api_manager.create_stream(
-            ["arr"],
-            ["!miniTicker"],
-            api_key=config.BINANCE_API_KEY,
-            api_secret=config.BINANCE_API_SECRET_KEY,
-        )
+        if config.BINANCE_STREAM_URL:
+            self.bw_api_manager.websocket_base_uri = config.BINANCE_STREAM_URL.rstrip("/") + "/"
+        if config.BINANCE_API_URL:
+            # The listen key of the user data stream is requested through the REST API
+            self.bw_api_manager.restclient.restful_base_uri = config.BINANCE_API_URL.rstrip("/") + "/"
         self.bw_api_manager.create_stream(
             ["arr"],
             ["!userData"],
             api_key=config.BINANCE_API_KEY,
             api_secret=config.BINANCE_API_SECRET_KEY,
         )
-        self.binance_client = binance_client
-        self.pending_orders: Set[Tuple[str, int]] = set()
-        self.pending_orders_mutex: threading.Lock = threading.Lock()
         self._processorThread = threading.Thread(target=self._stream_processor)
         self._processorThread.start()
 
+    def set_markets(self, symbols: Iterable[str]):
+        """
+        Subscribe to the market channels of exactly the given symbols. Symbols are added to the existing
+        connections while they have room left under the exchange's subscription limit, and spread over
+        new connections once they are full.
+        """
+        if self.bw_api_manager is None:
+            return
+        wanted = {symbol.lower() for symbol in symbols}
+        capacity = max(self.bw_api_manager.get_limit_of_subscriptions_per_stream() // len(self.MARKET_CHANNELS), 1)
+        with self._market_streams_mutex:
+            for stream_id, markets in list(self._market_streams.items()):
+                removed = markets - wanted
+                if not removed:
+                    continue
+                markets -= removed
+                if markets:
+                    self.bw_api_manager.unsubscribe_from_stream(stream_id, markets=list(removed))
+                else:
+                    self.bw_api_manager.stop_stream(stream_id)
+                    del self._market_streams[stream_id]
+
+            missing = sorted(wanted.difference(*self._market_streams.values()))
+            for stream_id, markets in self._market_streams.items():
+                free = capacity - len(markets)
+                if missing and free > 0:
+                    added, missing = missing[:free], missing[free:]
+                    self.bw_api_manager.subscribe_to_stream(stream_id, markets=added)
+                    markets.update(added)
+            while missing:
+                added, missing = missing[:capacity], missing[capacity:]
+                stream_id = self.bw_api_manager.create_stream(self.MARKET_CHANNELS, added)
+                self._market_streams[stream_id] = set(added)
+
+        self.logger.debug(
+            f"Subscribed to {len(wanted)} markets over {len(self._market_streams)} connections",
+            False,
+        )
+
     def acquire_order_guard(self):
-        return OrderGuard(self.pending_orders, self.pending_orders_mutex)
+        return OrderGuard(self.pending_orders, self.pending_orders_mutex, self.cache.orders)
 
     def _fetch_pending_orders(self):
         pending_orders: Set[Tuple[str, int]]
         with self.pending_orders_mutex:
             pending_orders = self.pending_orders.copy()
-        for symbol, order_id in pending_orders:
-            order = None
-            while True:
-                try:
-                    order = self.binance_client.get_order(symbol=symbol, orderId=order_id)
-                except (BinanceRequestException, BinanceAPIException) as e:
-                    self.logger.error(f"Got exception during fetching pending order: {e}")
-                if order is not None:
-                    break
-                time.sleep(1)
-            fake_report = {
-                "symbol": order["symbol"],
-                "side": order["side"],
-                "order_type": order["type"],
-                "order_id": order["orderId"],
-                "cumulative_quote_asset_transacted_quantity": float(order["cummulativeQuoteQty"]),
-                "current_order_status": order["status"],
-                "order_price": float(order["price"]),
-                "transaction_time": order["time"],
-            }
-            self.logger.info(
-                f"Pending order {order_id} for symbol {symbol} fetched:\n{fake_report}",
-                False,
-            )
-            self.cache.orders[fake_report["order_id"]] = BinanceOrder(fake_report)
+        if not pending_orders:
+            return
+        # The stream is live again, the updates it delivers from now on are newer than what the requests return
+        cached = {order_id: self.cache.orders.get(order_id) for _, order_id in pending_orders}
+
+        def fetch():
+            with ThreadPoolExecutor(max_workers=min(len(pending_orders), self.ORDER_FETCH_WORKERS)) as executor:
+                for symbol, order_id in pending_orders:
+                    executor.submit(self._fetch_pending_order, symbol, order_id, cached[order_id])
+
+        self._reconcile(fetch)
+
+    def _fetch_pending_order(self, symbol: str, order_id: int, cached: Optional[BinanceOrder]):
+        order = None
+        attempt = 0
+        while True:
+            try:
+                order = self.binance_client.get_order(symbol=symbol, orderId=order_id)
+            except (BinanceRequestException, BinanceAPIException) as e:
+                self.logger.error(f"Got exception during fetching pending order: {e}")
+            if order is not None:
+                break
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+        fake_report = {
+            "symbol": order["symbol"],
+            "side": order["side"],
+            "order_type": order["type"],
+            "order_id": order["orderId"],
+            "cumulative_quote_asset_transacted_quantity": float(order["cummulativeQuoteQty"]),
+            "current_order_status": order["status"],
+            "order_price": float(order["price"]),
+            "transaction_time": order["time"],
+        }
+        if not self.cache.set_order_if_unchanged(BinanceOrder(fake_report), cached):
+            self.logger.debug(f"Pending order {order_id} for symbol {symbol} was updated by the stream meanwhile")
+            return
+        self.logger.info(
+            f"Pending order {order_id} for symbol {symbol} fetched:\n{fake_report}",
+            False,
+        )
+
+    def refresh_tickers(self, min_interval: float = TICKER_REFRESH_INTERVAL):
+        """
+        Fetch the prices of all symbols in one request, to fill the gap left by a market stream reconnect.
+        Nothing is done if the last refresh is less than `min_interval` seconds old, callers arriving while
+        a refresh is in flight wait for it instead of making their own.
+        """
+        with self._tickers_refresh_mutex:
+            if time.monotonic() - self._tickers_refreshed_at < min_interval:
+                # Market streams tend to reconnect together, a single refresh covers all of them
+                return
+            try:
+                tickers = self.binance_client.get_symbol_ticker()
+            except (BinanceRequestException, BinanceAPIException) as e:
+                self.logger.error(f"Got exception during fetching ticker prices: {e}")
+                return
+            self.cache.tickers.update_many({ticker["symbol"]: float(ticker["price"]) for ticker in tickers})
+            self._tickers_refreshed_at = time.monotonic()
+        self.logger.debug(f"Refreshed {len(tickers)} ticker prices", False)
+
+    def _reconcile(self, func: Callable[[], None]):
+        def run():
+            try:
+                func()
+            except Exception:  # pylint: disable=broad-except
+                self.logger.error(f"Failed to reconcile after a stream reconnect:\n{traceback.format_exc()}")
+
+        self._reconciler.submit(run)
 
     def _invalidate_balances(self):
-        with self.cache.open_balances() as balances:
-            balances.clear()
+        self.cache.balances.invalidate()
+        self.cache.fees.clear()
+
+    def _enqueue_stream_data(self, stream_data, stream_buffer_name=False):  # pylint: disable=unused-argument
+        self._queue.put((time.monotonic(), None, stream_data))
+
+    def _enqueue_stream_signal(
+        self, signal_type=False, stream_id=False, data_record=False
+    ):  # pylint: disable=unused-argument
+        self._queue.put((time.monotonic(), signal_type, stream_id))
 
     def _stream_processor(self):
-        while True:
-            if self.bw_api_manager.is_manager_stopping():
-                sys.exit()
+        while not self.bw_api_manager.is_manager_stopping():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=1))
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._process_batch(batch)
+            self._report_stats()
+
+    def _process_batch(self, batch: List[Tuple[float, Optional[str], Any]]):
+        # The first event of the batch waited the longest
+        now = time.monotonic()
+        lag = now - batch[0][0]
+        for received_at, signal_type, item in batch:
+            try:
+                self._process_item(now, received_at, signal_type, item)
+            except Exception:  # pylint: disable=broad-except
+                self.logger.error(f"Failed to process stream event:\n{traceback.format_exc()}")
+        self._stats["events"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["lag"] = lag
+        self._stats["max_lag"] = max(self._stats["max_lag"], lag)
+
+    def _process_item(self, now: float, received_at: float, signal_type: Optional[str], item):
+        """
+        Process a stream event, or a stream signal when `signal_type` is set
+        """
+        if signal_type is not None:
+            self._process_stream_signal(signal_type, item)
+            return
+        if self.recorder is not None:
+            self.recorder.record(time.time() - (now - received_at), item)
+        self._process_stream_data(item)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Processing statistics since the last report: number of events and batches processed, lag of the
+        last batch and maximum lag in seconds, and current queue depth
+        """
+        return {**self._stats, "queue_depth": self._queue.qsize()}
 
-            stream_signal = self.bw_api_manager.pop_stream_signal_from_stream_signal_buffer()
-            stream_data = self.bw_api_manager.pop_stream_data_from_stream_buffer()
+    def _report_stats(self):
+        now = time.monotonic()
+        if now - self._stats_reported_at < self.STATS_INTERVAL:
+            return
+        stats = self.stats()
+        orders = self.cache.orders.stats()
+        message = (
+            f"Stream processing: {stats['events']} events in {stats['batches']} batches, "
+            f"queue depth {stats['queue_depth']}, max lag {stats['max_lag'] * 1000:.1f}ms, "
+            f"{orders['size']} orders cached ({orders['pinned']} pinned, {orders['expired']} expired, "
+            f"{orders['evicted']} evicted)"
+        )
+        if stats["max_lag"] > 1:
+            self.logger.warning(message, False)
+        else:
+            self.logger.debug(message, False)
+        self._stats.update(events=0, batches=0, max_lag=0.0)
+        self._stats_reported_at = now
 
-            if stream_signal is not False:
-                signal_type = stream_signal["type"]
-                stream_id = stream_signal["stream_id"]
+    def _process_stream_signal(self, signal_type: str, stream_id):
+        if signal_type in ("CONNECT", "DISCONNECT"):
+            stream_info = self.bw_api_manager.get_stream_info(stream_id)
+            if "!userData" in stream_info["markets"]:
+                # Balance events may be missed while disconnected, balances are reloaded on next use
+                self._invalidate_balances()
                 if signal_type == "CONNECT":
-                    stream_info = self.bw_api_manager.get_stream_info(stream_id)
-                    if "!userData" in stream_info["markets"]:
-                        self.logger.debug("Connect for userdata arrived", False)
-                        self._fetch_pending_orders()
-                        self._invalidate_balances()
-            if stream_data is not False:
-                self._process_stream_data(stream_data)
-            if stream_data is False and stream_signal is False:
-                time.sleep(0.01)
+                    self.logger.debug("Connect for userdata arrived", False)
+                    self._fetch_pending_orders()
+            elif signal_type == "CONNECT":
+                self._reconcile(self.refresh_tickers)
 
     def _process_stream_data(self, stream_data):
-        event_type = stream_data["event_type"]
-        if event_type == "executionReport":  # !userData
-            self.logger.debug(f"execution report: {stream_data}")
-            order = BinanceOrder(stream_data)
-            self.cache.orders[order.id] = order
-        elif event_type == "balanceUpdate":  # !userData
-            self.logger.debug(f"Balance update: {stream_data}")
-            with self.cache.open_balances() as balances:
-                asset = stream_data["asset"]
-                if asset in balances:
-                    del balances[stream_data["asset"]]
-        elif event_type in (
-            "outboundAccountPosition",
-            "outboundAccountInfo",
-        ):  # !userData
-            self.logger.debug(f"{event_type}: {stream_data}")
-            with self.cache.open_balances() as balances:
-                for bal in stream_data["balances"]:
-                    balances[bal["asset"]] = float(bal["free"])
-        elif event_type == "24hrMiniTicker":
-            for event in stream_data["data"]:
-                self.cache.ticker_values[event["symbol"]] = float(event["close_price"])
-        else:
+        event_type = stream_data.get("event_type")
+        if event_type is None:
+            # Subscription results and such
+            self.logger.debug(f"Stream message without event: {stream_data}", False)
+            return
+        handler = self._event_handlers.get(event_type)
+        if handler is None:
             self.logger.error(f"Unknown event type found: {event_type}\n{stream_data}")
+            return
+        handler(stream_data)
+
+    def _on_execution_report(self, stream_data):  # !userData
+        self.logger.debug(f"execution report: {stream_data}")
+        self.cache.set_order(BinanceOrder(stream_data))
+
+    def _on_balance_update(self, stream_data):  # !userData
+        self.logger.debug(f"Balance update: {stream_data}")
+        asset = stream_data["asset"]
+        if not self.cache.balances.apply_delta(
+            asset, float(stream_data["balance_delta"]), int(stream_data["clear_time"])
+        ):
+            self.logger.warning(f"Balance update for {asset} doesn't match cached balances, reloading them")
+            self.cache.fees.clear()
+        self.cache.fees.invalidate([asset])
+
+    def _on_account_position(self, stream_data):  # !userData
+        self.logger.debug(f"{stream_data['event_type']}: {stream_data}")
+        changed_assets = self.cache.balances.apply_position(
+            ((bal["asset"], float(bal["free"])) for bal in stream_data["balances"]),
+            int(stream_data.get("last_update_time", stream_data["event_time"])),
+        )
+        self.cache.fees.invalidate(changed_assets)
+
+    def _on_mini_ticker(self, stream_data):
+        tickers = self.cache.tickers
+        for event in stream_data["data"]:
+            symbol = event["symbol"]
+            if symbol in tickers and tickers.update(symbol, float(event["close_price"])):
+                self.scout_trigger.notify(symbol)
+
+    def _on_book_ticker(self, stream_data):
+        self.cache.book_tickers[stream_data["symbol"]] = (
+            float(stream_data["best_bid_price"]),
+            float(stream_data["best_ask_price"]),
+        )
 
     def close(self):
-        self.bw_api_manager.stop_manager_with_all_streams()
+        if self.bw_api_manager is not None:
+            self.bw_api_manager.stop_manager_with_all_streams()
+        self._reconciler.shutdown(wait=False)
+        if self.recorder is not None:
+            self.recorder.close()
@@ -18,11 +18,22 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
             "scout_multiplier": "5",
             "scout_margin": "0.8",
             "scout_sleep_time": "5",
+            "scout_mode": "interval",
+            "max_price_age": "60",
+            "stream_record_file": "",
             "hourToKeepScoutHistory": "1",
+            "scout_history_flush_interval": "0",
+            "scout_history_buffer_size": "10000",
+            "scout_history_overflow": "flush",
+            "update_publish_interval": "1",
+            "update_queue_size": "1000",
             "tld": "com",
+            "api_url": "",
+            "stream_url": "",
             "strategy": "default",
             "sell_timeout": "0",
             "buy_timeout": "0",
+            "order_price": "book",
             "testnet": False,
         }
 
@@ -41,6 +52,26 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
             os.environ.get("HOURS_TO_KEEP_SCOUTING_HISTORY") or config.get(USER_CFG_SECTION, "hourToKeepScoutHistory")
         )
 
+        # Scout history buffering settings
+        self.SCOUT_HISTORY_FLUSH_INTERVAL = float(
+            os.environ.get("SCOUT_HISTORY_FLUSH_INTERVAL")
+            or config.get(USER_CFG_SECTION, "scout_history_flush_interval")
+        )
+        self.SCOUT_HISTORY_BUFFER_SIZE = int(
+            os.environ.get("SCOUT_HISTORY_BUFFER_SIZE") or config.get(USER_CFG_SECTION, "scout_history_buffer_size")
+        )
+        self.SCOUT_HISTORY_OVERFLOW = os.environ.get("SCOUT_HISTORY_OVERFLOW") or config.get(
+            USER_CFG_SECTION, "scout_history_overflow"
+        )
+
+        # Dashboard update settings
+        self.UPDATE_PUBLISH_INTERVAL = float(
+            os.environ.get("UPDATE_PUBLISH_INTERVAL") or config.get(USER_CFG_SECTION, "update_publish_interval")
+        )
+        self.UPDATE_QUEUE_SIZE = int(
+            os.environ.get("UPDATE_QUEUE_SIZE") or config.get(USER_CFG_SECTION, "update_queue_size")
+        )
+
         # Get config for scout
         self.SCOUT_MULTIPLIER = float(
             os.environ.get("SCOUT_MULTIPLIER") or config.get(USER_CFG_SECTION, "scout_multiplier")
@@ -48,11 +79,19 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
         self.SCOUT_SLEEP_TIME = int(
             os.environ.get("SCOUT_SLEEP_TIME") or config.get(USER_CFG_SECTION, "scout_sleep_time")
         )
+        self.SCOUT_MODE = os.environ.get("SCOUT_MODE") or config.get(USER_CFG_SECTION, "scout_mode")
+        self.MAX_PRICE_AGE = float(os.environ.get("MAX_PRICE_AGE") or config.get(USER_CFG_SECTION, "max_price_age"))
+        self.STREAM_RECORD_FILE = os.environ.get("STREAM_RECORD_FILE") or config.get(
+            USER_CFG_SECTION, "stream_record_file"
+        )
 
         # Get config for binance
         self.BINANCE_API_KEY = os.environ.get("API_KEY") or config.get(USER_CFG_SECTION, "api_key")
         self.BINANCE_API_SECRET_KEY = os.environ.get("API_SECRET_KEY") or config.get(USER_CFG_SECTION, "api_secret_key")
         self.BINANCE_TLD = os.environ.get("TLD") or config.get(USER_CFG_SECTION, "tld")
+        # Base URLs replacing Binance's own, e.g. to run against binance_trade_bot.fake_exchange
+        self.BINANCE_API_URL = os.environ.get("API_URL") or config.get(USER_CFG_SECTION, "api_url")
+        self.BINANCE_STREAM_URL = os.environ.get("STREAM_URL") or config.get(USER_CFG_SECTION, "stream_url")
 
         # Get supported coin list from the environment
         supported_coin_list = [
@@ -74,6 +113,7 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
 
         self.SELL_TIMEOUT = os.environ.get("SELL_TIMEOUT") or config.get(USER_CFG_SECTION, "sell_timeout")
         self.BUY_TIMEOUT = os.environ.get("BUY_TIMEOUT") or config.get(USER_CFG_SECTION, "buy_timeout")
+        self.ORDER_PRICE = os.environ.get("ORDER_PRICE") or config.get(USER_CFG_SECTION, "order_price")
 
         self.USE_MARGIN = os.environ.get("USE_MARGIN") or config.get(USER_CFG_SECTION, "use_margin")
         self.SCOUT_MARGIN = float(os.environ.get("SCOUT_MARGIN") or config.get(USER_CFG_SECTION, "scout_margin"))
@@ -39,13 +39,22 @@ def main():
     trader.initialize()
 
     schedule = SafeScheduler(logger)
-    schedule.every(config.SCOUT_SLEEP_TIME).seconds.do(trader.scout).tag("scouting")
+    scouting_job = schedule.every(config.SCOUT_SLEEP_TIME).seconds.do(trader.scout).tag("scouting")
     schedule.every(1).minutes.do(trader.update_values).tag("updating value history")
     schedule.every(1).minutes.do(db.prune_scout_history).tag("pruning scout history")
     schedule.every(1).hours.do(db.prune_value_history).tag("pruning value history")
+
+    # In event mode, scout as soon as the price of any enabled coin changes. The schedule above is
+    # kept as a fallback for quiet markets.
+    scout_trigger = manager.stream_manager.scout_trigger
     try:
         while True:
             schedule.run_pending()
-            time.sleep(1)
+            if config.SCOUT_MODE == "event":
+                if scout_trigger.wait(1):
+                    schedule.run_now(scouting_job)
+            else:
+                time.sleep(1)
     finally:
-        manager.stream_manager.close()
\ No newline at end of file
+        manager.stream_manager.close()
+        db.close()
@@ -1,80 +1,188 @@
 import json
 import os
+import threading
 import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
 from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Optional, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
-from socketio import Client
-from socketio.exceptions import ConnectionError as SocketIOConnectionError
-from sqlalchemy import create_engine, func
+from sqlalchemy import and_, create_engine, event, func, inspect, select
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
 from .config import Config
+from .database_writer import DatabaseWriter
 from .logger import Logger
+from .migrations import SCHEMA_VERSION, migrate, set_schema_version
 from .models import *  # pylint: disable=wildcard-import
+from .scout_history_store import ScoutHistoryStore
+from .update_publisher import UpdatePublisher
+
+
+class PairStore:  # pylint: disable=too-few-public-methods
+    """
+    The pairs keyed by their coins' symbols, along with the pairs from and to each coin, so that looking up
+    the pairs of one coin doesn't go through all N×N of them.
+    """
+
+    def __init__(self, pairs: List[Pair]):
+        self.pairs: Dict[Tuple[str, str], Pair] = {}
+        self.from_coin: Dict[str, List[Pair]] = defaultdict(list)
+        self.to_coin: Dict[str, List[Pair]] = defaultdict(list)
+        for pair in pairs:
+            self.pairs[(pair.from_coin_id, pair.to_coin_id)] = pair
+            self.from_coin[pair.from_coin_id].append(pair)
+            self.to_coin[pair.to_coin_id].append(pair)
+
+
+class Database:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
+    # Seconds to wait after the first ratio change before writing the batch of dirty pairs back
+    PAIR_FLUSH_INTERVAL = 5
+
+    # Applied to every new connection to an SQLite database file. The bot and the API server share the
+    # file: in WAL mode readers don't block the writer and commits only sync the log at checkpoints.
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+    POOL_SIZE = 5
 
-
-class Database:
     def __init__(self, logger: Logger, config: Config, uri="sqlite:///data/crypto_trading.db"):
         self.logger = logger
         self.config = config
-        self.engine = create_engine(uri)
+        self.engine = self._create_engine(uri)
         self.SessionMaker = sessionmaker(bind=self.engine)
-        self.socketio_client = Client()
+        # Sessions are thread local, each thread reuses its own across db_session calls
+        self.Session = scoped_session(self.SessionMaker)
+
+        # In-memory pair store, authoritative for ratios once loaded. Dirty ratios are written back
+        # to the pairs table in batches by a background thread.
+        self._pairs: Optional[PairStore] = None
+        self._pairs_lock = threading.Lock()
+        self._dirty_ratios: Dict[int, float] = {}
+        self._pairs_dirty = threading.Event()
+        self._pair_flusher: Optional[threading.Thread] = None
+
+        self._coins_listeners: List[Callable[[List[str]], None]] = []
+
+        self.update_publisher = UpdatePublisher(logger, config.UPDATE_PUBLISH_INTERVAL, config.UPDATE_QUEUE_SIZE)
+        # All the writes go through a single thread, off the scouting and order paths. An in-memory
+        # database shares a single connection between threads, and can't have a transaction of its own.
+        self.writer = DatabaseWriter(
+            self.db_session,
+            self.update_publisher.publish,
+            logger,
+            threaded=not isinstance(self.engine.pool, StaticPool),
+        )
+        # Current coin as last set by this process, the database may not be up to date with it yet
+        self._current_coin: Optional[Coin] = None
+
+        self.scout_history_store = ScoutHistoryStore(config.SCOUT_HISTORY_PRUNE_TIME, logger)
+        self.scout_history = ScoutHistoryBuffer(
+            self,
+            config.SCOUT_HISTORY_BUFFER_SIZE,
+            config.SCOUT_HISTORY_OVERFLOW,
+            config.SCOUT_HISTORY_FLUSH_INTERVAL,
+        )
 
-    def socketio_connect(self):
-        if self.socketio_client.connected and self.socketio_client.namespaces:
-            return True
-        try:
-            if not self.socketio_client.connected:
-                self.socketio_client.connect("http://api:5123", namespaces=["/backend"])
-            while not self.socketio_client.connected or not self.socketio_client.namespaces:
-                time.sleep(0.1)
-            return True
-        except SocketIOConnectionError:
-            return False
+    def _create_engine(self, uri: str) -> Engine:
+        url = make_url(uri)
+        if url.get_backend_name() != "sqlite":
+            return create_engine(uri)
+        if url.database in (None, "", ":memory:"):
+            # An in-memory database only lives as long as its connection, share it with the writer thread
+            return create_engine(uri, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+        # Pooled connections are handed from thread to thread, but never used by two at once
+        engine = create_engine(
+            uri, connect_args={"check_same_thread": False}, poolclass=QueuePool, pool_size=self.POOL_SIZE
+        )
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in self.SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            cursor.close()
+
+        return engine
 
     @contextmanager
     def db_session(self):
         """
-        Creates a context with an open SQLAlchemy session.
+        Creates a context with an open SQLAlchemy session, committed when leaving the context and rolled
+        back on error. Nested contexts of a thread share the session of the outermost one.
         """
-        session: Session = scoped_session(self.SessionMaker)
-        yield session
-        session.commit()
-        session.close()
+        session: Session = self.Session()
+        depth = session.info.get("depth", 0)
+        session.info["depth"] = depth + 1
+        try:
+            yield session
+            if depth == 0:
+                session.commit()
+        except BaseException:
+            if depth == 0:
+                session.rollback()
+            raise
+        finally:
+            session.info["depth"] = depth
+            if depth == 0:
+                session.close()
 
     def set_coins(self, symbols: List[str]):
-        session: Session
+        self.writer.run(lambda session: self._write_coins(session, symbols))
+
+        # Coin enablement changed, reload the pair store on next access
+        self._invalidate_pairs()
+
+        for listener in self._coins_listeners:
+            listener(symbols)
+
+    @staticmethod
+    def _write_coins(session: Session, symbols: List[str]):
+        # For all the coins in the database, if the symbol no longer appears
+        # in the config file, set the coin as disabled
+        coins: List[Coin] = session.query(Coin).all()
+        for coin in coins:
+            if coin.symbol not in symbols:
+                coin.enabled = False
+
+        # For all the symbols in the config file, add them to the database
+        # if they don't exist
+        for symbol in symbols:
+            coin = next((coin for coin in coins if coin.symbol == symbol), None)
+            if coin is None:
+                session.add(Coin(symbol))
+            else:
+                coin.enabled = True
+        session.flush()
+
+        # For all the combinations of enabled coins, add a pair to the database if it doesn't exist
+        coins = session.query(Coin).filter(Coin.enabled).all()
+        existing_pairs = set(session.query(Pair.from_coin_id, Pair.to_coin_id))
+        for from_coin in coins:
+            for to_coin in coins:
+                if from_coin != to_coin and (from_coin.symbol, to_coin.symbol) not in existing_pairs:
+                    session.add(Pair(from_coin, to_coin))
+
+        # A pair is enabled when both of its coins are
+        enabled_symbols = [coin.symbol for coin in coins]
+        session.query(Pair).update(
+            {Pair.enabled: and_(Pair.from_coin_id.in_(enabled_symbols), Pair.to_coin_id.in_(enabled_symbols))},
+            synchronize_session=False,
+        )
 
-        # Add coins to the database and set them as enabled or not
-        with self.db_session() as session:
-            # For all the coins in the database, if the symbol no longer appears
-            # in the config file, set the coin as disabled
-            coins: List[Coin] = session.query(Coin).all()
-            for coin in coins:
-                if coin.symbol not in symbols:
-                    coin.enabled = False
-
-            # For all the symbols in the config file, add them to the database
-            # if they don't exist
-            for symbol in symbols:
-                coin = next((coin for coin in coins if coin.symbol == symbol), None)
-                if coin is None:
-                    session.add(Coin(symbol))
-                else:
-                    coin.enabled = True
-
-        # For all the combinations of coins in the database, add a pair to the database
-        with self.db_session() as session:
-            coins: List[Coin] = session.query(Coin).filter(Coin.enabled).all()
-            for from_coin in coins:
-                for to_coin in coins:
-                    if from_coin != to_coin:
-                        pair = session.query(Pair).filter(Pair.from_coin == from_coin, Pair.to_coin == to_coin).first()
-                        if pair is None:
-                            session.add(Pair(from_coin, to_coin))
+    def add_coins_listener(self, listener: Callable[[List[str]], None]):
+        """
+        Register a callback called with the enabled coin symbols every time they are set
+        """
+        self._coins_listeners.append(listener)
 
     def get_coins(self, only_enabled=True) -> List[Coin]:
         session: Session
@@ -95,17 +203,20 @@ class Database:
             session.expunge(coin)
             return coin
 
-    def set_current_coin(self, coin: Union[Coin, str]):
+    def set_current_coin(self, coin: Union[Coin, str]) -> Future:
         coin = self.get_coin(coin)
-        session: Session
-        with self.db_session() as session:
-            if isinstance(coin, Coin):
-                coin = session.merge(coin)
-            cc = CurrentCoin(coin)
+        self._current_coin = coin
+
+        def write(session: Session):
+            cc = CurrentCoin(session.merge(coin))
             session.add(cc)
-            self.send_update(cc)
+            return [cc]
+
+        return self.writer.submit(write)
 
     def get_current_coin(self) -> Optional[Coin]:
+        if self._current_coin is not None:
+            return self._current_coin
         session: Session
         with self.db_session() as session:
             current_coin = session.query(CurrentCoin).order_by(CurrentCoin.datetime.desc()).first()
@@ -115,35 +226,81 @@ class Database:
             session.expunge(coin)
             return coin
 
+    def _pair_store(self) -> PairStore:
+        with self._pairs_lock:
+            if self._pairs is None:
+                session: Session
+                with self.db_session() as session:
+                    pairs: List[Pair] = session.query(Pair).all()
+                    session.expunge_all()
+                self._pairs = PairStore(pairs)
+            return self._pairs
+
+    def _invalidate_pairs(self):
+        self.flush_pairs()
+        with self._pairs_lock:
+            self._pairs = None
+
     def get_pair(self, from_coin: Union[Coin, str], to_coin: Union[Coin, str]):
-        from_coin = self.get_coin(from_coin)
-        to_coin = self.get_coin(to_coin)
-        session: Session
-        with self.db_session() as session:
-            pair: Pair = session.query(Pair).filter(Pair.from_coin == from_coin, Pair.to_coin == to_coin).first()
-            session.expunge(pair)
-            return pair
+        from_coin = from_coin.symbol if isinstance(from_coin, Coin) else from_coin
+        to_coin = to_coin.symbol if isinstance(to_coin, Coin) else to_coin
+        return self._pair_store().pairs.get((from_coin, to_coin))
 
     def get_pairs_from(self, from_coin: Union[Coin, str], only_enabled=True) -> List[Pair]:
-        from_coin = self.get_coin(from_coin)
-        session: Session
-        with self.db_session() as session:
-            pairs = session.query(Pair).filter(Pair.from_coin == from_coin)
-            if only_enabled:
-                pairs = pairs.filter(Pair.enabled.is_(True))
-            pairs = pairs.all()
-            session.expunge_all()
-            return pairs
+        from_coin = from_coin.symbol if isinstance(from_coin, Coin) else from_coin
+        return [pair for pair in self._pair_store().from_coin.get(from_coin, ()) if pair.enabled or not only_enabled]
+
+    def get_pairs_to(self, to_coin: Union[Coin, str], only_enabled=True) -> List[Pair]:
+        to_coin = to_coin.symbol if isinstance(to_coin, Coin) else to_coin
+        return [pair for pair in self._pair_store().to_coin.get(to_coin, ()) if pair.enabled or not only_enabled]
 
     def get_pairs(self, only_enabled=True) -> List[Pair]:
-        session: Session
-        with self.db_session() as session:
-            pairs = session.query(Pair)
-            if only_enabled:
-                pairs = pairs.filter(Pair.enabled.is_(True))
-            pairs = pairs.all()
-            session.expunge_all()
-            return pairs
+        return [pair for pair in self._pair_store().pairs.values() if pair.enabled or not only_enabled]
+
+    def set_pair_ratio(self, pair: Pair, ratio: float):
+        """
+        Update the ratio of a pair in memory, it is persisted asynchronously.
+        """
+        pair = self._pair_store().pairs.get((pair.from_coin_id, pair.to_coin_id), pair)
+        pair.ratio = ratio
+        with self._pairs_lock:
+            self._dirty_ratios[pair.id] = ratio
+            if self._pair_flusher is None:
+                self._pair_flusher = threading.Thread(target=self._flush_pairs_worker, daemon=True)
+                self._pair_flusher.start()
+        self._pairs_dirty.set()
+
+    def flush_pairs(self):
+        """
+        Write all the pending ratio changes to the pairs table in a single transaction.
+        """
+        with self._pairs_lock:
+            dirty_ratios, self._dirty_ratios = self._dirty_ratios, {}
+            self._pairs_dirty.clear()
+        if not dirty_ratios:
+            return
+
+        try:
+            self.writer.run(
+                lambda session: session.bulk_update_mappings(
+                    Pair, [{"id": pair_id, "ratio": ratio} for pair_id, ratio in dirty_ratios.items()]
+                )
+            )
+        except Exception:
+            with self._pairs_lock:
+                # Don't overwrite ratios that changed while we were writing
+                self._dirty_ratios = {**dirty_ratios, **self._dirty_ratios}
+                self._pairs_dirty.set()
+            raise
+
+    def _flush_pairs_worker(self):
+        while True:
+            self._pairs_dirty.wait()
+            time.sleep(self.PAIR_FLUSH_INTERVAL)
+            try:
+                self.flush_pairs()
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error(f"Failed to write pair ratios to the database: {e}")
 
     def log_scout(
         self,
@@ -152,80 +309,126 @@ class Database:
         current_coin_price: float,
         other_coin_price: float,
     ):
-        session: Session
-        with self.db_session() as session:
-            pair = session.merge(pair)
-            sh = ScoutHistory(pair, target_ratio, current_coin_price, other_coin_price)
-            session.add(sh)
-            self.send_update(sh)
+        self.scout_history.add(ScoutHistory(pair, target_ratio, current_coin_price, other_coin_price))
+
+    def flush_scout_history(self, force=False):
+        """
+        Write the buffered scout history, if forced or if the flush interval has passed.
+        Called at the end of every scouting tick.
+        """
+        self.scout_history.flush(force)
 
     def prune_scout_history(self):
-        time_diff = datetime.now() - timedelta(hours=self.config.SCOUT_HISTORY_PRUNE_TIME)
-        session: Session
-        with self.db_session() as session:
-            session.query(ScoutHistory).filter(ScoutHistory.datetime < time_diff).delete()
+        now = datetime.utcnow()
+        self.writer.submit(lambda session: self.scout_history_store.prune(session.connection(), now))
+
+    def log_coin_values(self, coin_values: List[CoinValue]):
+        def write(session: Session):
+            # The values themselves stay transient, the write can be applied again
+            return [session.merge(cv) for cv in coin_values]
+
+        self.writer.submit(write)
 
     def prune_value_history(self):
-        session: Session
-        with self.db_session() as session:
-            # Sets the first entry for each coin for each hour as 'hourly'
-            hourly_entries: List[CoinValue] = (
-                session.query(CoinValue).group_by(CoinValue.coin_id, func.strftime("%H", CoinValue.datetime)).all()
-            )
-            for entry in hourly_entries:
-                entry.interval = Interval.HOURLY
+        self.writer.submit(lambda session: self._prune_value_history(session, datetime.now()))
 
-            # Sets the first entry for each coin for each day as 'daily'
-            daily_entries: List[CoinValue] = (
-                session.query(CoinValue).group_by(CoinValue.coin_id, func.date(CoinValue.datetime)).all()
-            )
-            for entry in daily_entries:
-                entry.interval = Interval.DAILY
+    def _prune_value_history(self, session: Session, now: datetime):
+        self._rollup_value_history(session, now)
 
-            # Sets the first entry for each coin for each month as 'weekly'
-            # (Sunday is the start of the week)
-            weekly_entries: List[CoinValue] = (
-                session.query(CoinValue).group_by(CoinValue.coin_id, func.strftime("%Y-%W", CoinValue.datetime)).all()
-            )
-            for entry in weekly_entries:
-                entry.interval = Interval.WEEKLY
+        # The last 24 hours worth of minutely entries will be kept, so
+        # count(coins) * 1440 entries
+        time_diff = now - timedelta(hours=24)
+        session.query(CoinValue).filter(
+            CoinValue.interval == Interval.MINUTELY, CoinValue.datetime < time_diff
+        ).delete()
 
-            # The last 24 hours worth of minutely entries will be kept, so
-            # count(coins) * 1440 entries
-            time_diff = datetime.now() - timedelta(hours=24)
-            session.query(CoinValue).filter(
-                CoinValue.interval == Interval.MINUTELY, CoinValue.datetime < time_diff
-            ).delete()
+        # The last 28 days worth of hourly entries will be kept, so count(coins) * 672 entries
+        time_diff = now - timedelta(days=28)
+        session.query(CoinValue).filter(CoinValue.interval == Interval.HOURLY, CoinValue.datetime < time_diff).delete()
 
-            # The last 28 days worth of hourly entries will be kept, so count(coins) * 672 entries
-            time_diff = datetime.now() - timedelta(days=28)
-            session.query(CoinValue).filter(
-                CoinValue.interval == Interval.HOURLY, CoinValue.datetime < time_diff
-            ).delete()
+        # The last years worth of daily entries will be kept, so count(coins) * 365 entries
+        time_diff = now - timedelta(days=365)
+        session.query(CoinValue).filter(CoinValue.interval == Interval.DAILY, CoinValue.datetime < time_diff).delete()
 
-            # The last years worth of daily entries will be kept, so count(coins) * 365 entries
-            time_diff = datetime.now() - timedelta(days=365)
+        # All weekly entries will be kept forever
+
+    @staticmethod
+    def _rollup_value_history(session: Session, now: datetime):
+        """
+        Promote the first value of each coin in every hour, day and week to the HOURLY, DAILY and WEEKLY
+        intervals, a value keeps the coarsest interval it is the first of. Only the complete hours since the
+        last rollup are looked at, along with the earlier values of the day and week they fall in, so the
+        cost doesn't grow with the size of the history.
+        """
+        end = now.replace(minute=0, second=0, microsecond=0)
+        rollup: Optional[CoinValueRollup] = session.query(CoinValueRollup).first()
+        if rollup is None:
+            first_value_datetime = session.query(func.min(CoinValue.datetime)).scalar()
+            if first_value_datetime is None:
+                return
+            rollup = CoinValueRollup(first_value_datetime)
+            session.add(rollup)
+        if rollup.watermark >= end:
+            return
+
+        hour_start = rollup.watermark.replace(minute=0, second=0, microsecond=0)
+        day_start = hour_start.replace(hour=0)
+        week_start = day_start - timedelta(days=day_start.weekday())
+        for interval, bucket, start, finer_intervals in (
+            (Interval.HOURLY, func.strftime("%Y-%m-%d %H", CoinValue.datetime), hour_start, [Interval.MINUTELY]),
+            (Interval.DAILY, func.date(CoinValue.datetime), day_start, [Interval.MINUTELY, Interval.HOURLY]),
+            (
+                Interval.WEEKLY,
+                func.strftime("%Y-%W", CoinValue.datetime),
+                week_start,
+                [Interval.MINUTELY, Interval.HOURLY, Interval.DAILY],
+            ),
+        ):
+            # SQLite returns the other columns of the row holding the min() of a group
+            first_values = (
+                select(CoinValue.id, func.min(CoinValue.datetime))
+                .where(CoinValue.datetime >= start, CoinValue.datetime < end)
+                .group_by(CoinValue.coin_id, bucket)
+                .subquery()
+            )
             session.query(CoinValue).filter(
-                CoinValue.interval == Interval.DAILY, CoinValue.datetime < time_diff
-            ).delete()
+                CoinValue.id.in_(select(first_values.c.id)), CoinValue.interval.in_(finer_intervals)
+            ).update({CoinValue.interval: interval}, synchronize_session=False)
 
-            # All weekly entries will be kept forever
+        rollup.watermark = end
 
     def create_database(self):
-        Base.metadata.create_all(self.engine)
+        new_database = not inspect(self.engine).get_table_names()
+        Base.metadata.create_all(
+            self.engine, tables=[table for table in Base.metadata.sorted_tables if not table.info.get("view")]
+        )
+        with self.engine.begin() as connection:
+            if new_database:
+                set_schema_version(connection, SCHEMA_VERSION)
+            else:
+                migrate(connection, self.logger)
+            self.scout_history_store.create(connection)
+
+    def close(self):
+        """
+        Persist everything that is still only held in memory.
+        """
+        self.flush_pairs()
+        self.flush_scout_history(True)
+        self.writer.close()
+        self.update_publisher.close()
+
+    def barrier(self, timeout: float = None):
+        """
+        Block until every write submitted so far is committed, raising the error of a write that failed
+        """
+        self.writer.barrier(timeout)
 
     def start_trade_log(self, from_coin: Coin, to_coin: Coin, selling: bool):
         return TradeLog(self, from_coin, to_coin, selling)
 
     def send_update(self, model):
-        if not self.socketio_connect():
-            return
-
-        self.socketio_client.emit(
-            "update",
-            {"table": model.__tablename__, "data": model.info()},
-            namespace="/backend",
-        )
+        self.update_publisher.publish(model.__tablename__, model.info())
 
     def migrate_old_state(self):
         """
@@ -244,50 +447,148 @@ class Database:
             with open(".current_coin_table") as f:
                 self.logger.info(f".current_coin_table file found, loading into database")
                 table: dict = json.load(f)
-                session: Session
-                with self.db_session() as session:
-                    for from_coin, to_coin_dict in table.items():
-                        for to_coin, ratio in to_coin_dict.items():
-                            if from_coin == to_coin:
-                                continue
-                            pair = session.merge(self.get_pair(from_coin, to_coin))
-                            pair.ratio = ratio
-                            session.add(pair)
+                for from_coin, to_coin_dict in table.items():
+                    for to_coin, ratio in to_coin_dict.items():
+                        if from_coin == to_coin:
+                            continue
+                        self.set_pair_ratio(self.get_pair(from_coin, to_coin), ratio)
+                self.flush_pairs()
 
             os.rename(".current_coin_table", ".current_coin_table.old")
             self.logger.info(".current_coin_table renamed to .current_coin_table.old - " "You can now delete this file")
 
 
+class ScoutHistoryBuffer:
+    """
+    Collects scout history rows in memory and writes them to the database in a single
+    transaction per flush, instead of one commit per row.
+
+    The buffer is bounded, when it is full the overflow policy decides what happens:
+    - flush: write the buffer and wait for it to be committed (backpressure on the scouting thread)
+    - drop_oldest: discard the oldest buffered row
+    - drop_newest: discard the new row
+    """
+
+    OVERFLOW_POLICIES = ("flush", "drop_oldest", "drop_newest")
+
+    def __init__(self, db: Database, max_size: int, overflow: str, flush_interval: float):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid scout history overflow policy: {overflow}")
+        self.db = db
+        self.max_size = max_size
+        self.overflow = overflow
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._rows = deque()
+        self._mutex = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, scout_history: ScoutHistory):
+        with self._mutex:
+            if len(self._rows) < self.max_size:
+                self._rows.append(scout_history)
+                return
+            if self.overflow == "drop_newest":
+                self.dropped += 1
+                return
+            if self.overflow == "drop_oldest":
+                self._rows.popleft()
+                self._rows.append(scout_history)
+                self.dropped += 1
+                return
+        future = self.flush(True)
+        if future is not None:
+            # Wait for the write without raising its error, the writer already logged it
+            future.exception()
+        with self._mutex:
+            self._rows.append(scout_history)
+
+    def flush(self, force=False) -> Optional[Future]:
+        """
+        Hand the buffered rows to the database writer, returns the future of the write if there was any
+        """
+        with self._mutex:
+            if not force and time.monotonic() - self._last_flush < self.flush_interval:
+                return None
+            scout_histories, self._rows = self._rows, deque()
+            self._last_flush = time.monotonic()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self.db.logger.warning(f"Scout history buffer full, dropped {dropped} rows", False)
+        if not scout_histories:
+            return None
+
+        rows = [
+            {
+                "pair_id": sh.pair.id,
+                "target_ratio": sh.target_ratio,
+                "current_coin_price": sh.current_coin_price,
+                "other_coin_price": sh.other_coin_price,
+                "datetime": sh.datetime,
+            }
+            for sh in scout_histories
+        ]
+
+        def write(session: Session):
+            self.db.scout_history_store.insert(session.connection(), rows)
+            return scout_histories
+
+        return self.db.writer.submit(write)
+
+
 class TradeLog:
+    """
+    Trade history of a single trade, written by the database writer so that it doesn't hold up the orders.
+    The state of the trade is kept here and every change writes all of it to the trade's row, found by its
+    coins, side and time, so that each write can be applied again.
+    """
+
     def __init__(self, db: Database, from_coin: Coin, to_coin: Coin, selling: bool):
         self.db = db
-        session: Session
-        with self.db.db_session() as session:
-            from_coin = session.merge(from_coin)
-            to_coin = session.merge(to_coin)
-            self.trade = Trade(from_coin, to_coin, selling)
-            session.add(self.trade)
-            # Flush so that SQLAlchemy fills in the id column
-            session.flush()
-            self.db.send_update(self.trade)
-
-    def set_ordered(self, alt_starting_balance, crypto_starting_balance, alt_trade_amount):
-        session: Session
-        with self.db.db_session() as session:
-            trade: Trade = session.merge(self.trade)
-            trade.alt_starting_balance = alt_starting_balance
-            trade.alt_trade_amount = alt_trade_amount
-            trade.crypto_starting_balance = crypto_starting_balance
-            trade.state = TradeState.ORDERED
-            self.db.send_update(trade)
+        self.alt_coin = from_coin
+        self.crypto_coin = to_coin
+        self.selling = selling
+        self.datetime = datetime.utcnow()
+        self.state = {"state": TradeState.STARTING}
+        self._write()
+
+    def _write(self) -> Future:
+        state = dict(self.state)
+
+        def write(session: Session):
+            trade: Optional[Trade] = (
+                session.query(Trade)
+                .filter_by(
+                    alt_coin_id=self.alt_coin.symbol,
+                    crypto_coin_id=self.crypto_coin.symbol,
+                    selling=self.selling,
+                    datetime=self.datetime,
+                )
+                .first()
+            )
+            if trade is None:
+                trade = Trade(session.merge(self.alt_coin), session.merge(self.crypto_coin), self.selling)
+                trade.datetime = self.datetime
+                session.add(trade)
+            for column, value in state.items():
+                setattr(trade, column, value)
+            return [trade]
+
+        return self.db.writer.submit(write)
+
+    def set_ordered(self, alt_starting_balance, crypto_starting_balance, alt_trade_amount, jump_latency=None):
+        self.state.update(
+            alt_starting_balance=alt_starting_balance,
+            alt_trade_amount=alt_trade_amount,
+            crypto_starting_balance=crypto_starting_balance,
+            jump_latency=jump_latency,
+            state=TradeState.ORDERED,
+        )
+        self._write()
 
     def set_complete(self, crypto_trade_amount):
-        session: Session
-        with self.db.db_session() as session:
-            trade: Trade = session.merge(self.trade)
-            trade.crypto_trade_amount = crypto_trade_amount
-            trade.state = TradeState.COMPLETE
-            self.db.send_update(trade)
+        self.state.update(crypto_trade_amount=crypto_trade_amount, state=TradeState.COMPLETE)
+        self._write()
 
 
 if __name__ == "__main__":
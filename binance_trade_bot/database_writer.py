@@ -0,0 +1,135 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, ContextManager, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .logger import Logger
+
+# A write returns the models to publish once it is committed, if any
+Write = Callable[[Session], Optional[Iterable]]
+
+
+class DatabaseWriter:
+    """
+    Single thread applying the writes submitted by the other threads, in submission order. The writes
+    waiting in the queue are applied together in one transaction, a failing write is retried on its own
+    so that it doesn't take the others down with it. Writes must therefore only touch the session, and be
+    safe to apply again once rolled back. The models they return are published after the commit.
+
+    Submitting returns a future completed once the write is committed. Non threaded writers apply writes
+    right away on the submitting thread, for databases that can't be shared between connections.
+    """
+
+    # Maximum number of writes applied in a single transaction
+    MAX_BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        db_session: Callable[[], ContextManager[Session]],
+        publish: Callable[[str, dict], None],
+        logger: Logger,
+        threaded=True,
+    ):
+        self.db_session = db_session
+        self.publish = publish
+        self.logger = logger
+        self.threaded = threaded
+        self._queue: "queue.Queue[Optional[Tuple[Write, Future]]]" = queue.Queue()
+        self._mutex = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_future: Optional[Future] = None
+        # First write that failed since the last barrier
+        self._failed: Optional[Future] = None
+
+    def submit(self, write: Write) -> Future:
+        future = Future()
+        if not self.threaded:
+            self._apply([(write, future)])
+            return future
+        with self._mutex:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._queue.put((write, future))
+            self._last_future = future
+        return future
+
+    def run(self, write: Write):
+        """
+        Apply a write and wait for it to be committed, raising its error if it failed
+        """
+        self.submit(write).result()
+
+    def barrier(self, timeout: float = None):
+        """
+        Block until every write submitted so far is applied. Raises the error of the first write that failed
+        since the previous barrier, or TimeoutError if they aren't all applied in time.
+        """
+        with self._mutex:
+            future = self._last_future
+        if future is not None:
+            # Writes are applied in order, once the last one is done all of them are
+            future.exception(timeout)
+        with self._mutex:
+            failed, self._failed = self._failed, None
+        if failed is not None:
+            failed.result()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._apply(batch)
+                    return
+                batch.append(item)
+            self._apply(batch)
+
+    def _apply(self, batch: List[Tuple[Write, Future]]):
+        try:
+            session: Session
+            with self.db_session() as session:
+                published = [model for write, _ in batch for model in write(session) or ()]
+                # Fills in the ids before they are published
+                session.flush()
+                # A model changed by several writes of the batch is published once, in its final state
+                updates = [(model.__tablename__, model.info()) for model in dict.fromkeys(published)]
+        except Exception as e:  # pylint: disable=broad-except
+            if len(batch) > 1:
+                # The whole transaction was rolled back, find the culprit
+                for item in batch:
+                    self._apply([item])
+                return
+            self.logger.error(f"Database write failed: {e}")
+            future = batch[0][1]
+            with self._mutex:
+                if self._failed is None:
+                    self._failed = future
+            future.set_exception(e)
+            return
+        for table, data in updates:
+            self.publish(table, data)
+        for _, future in batch:
+            future.set_result(None)
+
+    def close(self):
+        """
+        Apply the queued writes and stop the thread
+        """
+        with self._mutex:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
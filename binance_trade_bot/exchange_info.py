@@ -0,0 +1,157 @@
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import binance.client
+
+from .logger import Logger
+
+# Only these filters are used by the bot, the rest is dropped from the cache
+USED_FILTERS = ("LOT_SIZE", "NOTIONAL", "MIN_NOTIONAL", "PRICE_FILTER")
+
+
+class SymbolInfo:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    def __init__(self, info: dict):
+        self.symbol: str = info["symbol"]
+        self.base_asset: str = info["baseAsset"]
+        self.quote_asset: str = info["quoteAsset"]
+        self.base_asset_precision: int = info["baseAssetPrecision"]
+        self.quote_precision: int = info["quotePrecision"]
+        self.filters: Dict[str, dict] = {_filter["filterType"]: _filter for _filter in info["filters"]}
+
+        self.step_size: str = self.filters.get("LOT_SIZE", {}).get("stepSize", "1")
+        if self.step_size.find("1") == 0:
+            self.alt_tick = 1 - self.step_size.find(".")
+        else:
+            self.alt_tick = self.step_size.find("1") - 1
+
+        notional = self.filters.get("NOTIONAL") or self.filters.get("MIN_NOTIONAL") or {}
+        self.min_notional = float(notional.get("minNotional", 0))
+        self.tick_size = float(self.filters.get("PRICE_FILTER", {}).get("tickSize", 0))
+
+    def __repr__(self):
+        return f"<SymbolInfo {self.symbol}>"
+
+
+class ExchangeInfo:
+    """
+    Local index of the exchange's symbols and their filters, built from a single exchangeInfo call.
+
+    The index is kept in a compressed file so that restarting the bot doesn't need a REST call as long
+    as the file is younger than `ttl`, and it is refreshed in the background once it gets older.
+    """
+
+    # Don't hit the API more than once per minute because of unknown symbols
+    MISS_REFRESH_INTERVAL = 60
+
+    def __init__(
+        self,
+        binance_client: binance.client.Client,
+        logger: Logger,
+        path="data/exchange_info.json.gz",
+        ttl=43200,
+    ):
+        self.binance_client = binance_client
+        self.logger = logger
+        self.path = path
+        self.ttl = ttl
+        self.fetched_at = 0.0
+        self._symbols: Dict[str, SymbolInfo] = {}
+        self._refresh_mutex = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+
+    def load(self):
+        """
+        Load the index from disk if it is fresh enough, from the API otherwise
+        """
+        if not self._load_from_disk():
+            self.refresh()
+
+    def _load_from_disk(self) -> bool:
+        if not os.path.isfile(self.path):
+            return False
+        try:
+            with gzip.open(self.path, "rt") as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Couldn't read exchange info cache {self.path}: {e}", False)
+            return False
+        if time.time() - cached["time"] > self.ttl:
+            return False
+        self._set_symbols(cached["symbols"], cached["time"])
+        self.logger.debug(f"Loaded exchange info for {len(self._symbols)} symbols from {self.path}")
+        return True
+
+    def refresh(self):
+        """
+        Fetch the exchange info from the API and write it to disk
+        """
+        with self._refresh_mutex:
+            exchange_info = self.binance_client.get_exchange_info()
+            symbols = [
+                {
+                    "symbol": info["symbol"],
+                    "baseAsset": info["baseAsset"],
+                    "quoteAsset": info["quoteAsset"],
+                    "baseAssetPrecision": info["baseAssetPrecision"],
+                    "quotePrecision": info["quotePrecision"],
+                    "filters": [_filter for _filter in info["filters"] if _filter["filterType"] in USED_FILTERS],
+                }
+                for info in exchange_info["symbols"]
+            ]
+            fetched_at = time.time()
+            self._set_symbols(symbols, fetched_at)
+            self.logger.debug(f"Fetched exchange info for {len(symbols)} symbols")
+
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with gzip.open(tmp_path, "wt") as f:
+                    json.dump({"time": fetched_at, "symbols": symbols}, f, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                self.logger.warning(f"Couldn't write exchange info cache {self.path}: {e}", False)
+
+    def _set_symbols(self, symbols, fetched_at: float):
+        # Swap the whole dict so readers never see a partially built index
+        self._symbols = {info["symbol"]: SymbolInfo(info) for info in symbols}
+        self.fetched_at = fetched_at
+
+    def start_refresh(self):
+        """
+        Keep the index up to date from a background thread
+        """
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_worker, daemon=True)
+            self._refresher.start()
+
+    def _refresh_worker(self):
+        while True:
+            time.sleep(max(self.fetched_at + self.ttl - time.time(), 0))
+            try:
+                self.refresh()
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.warning(f"Couldn't refresh exchange info: {e}", False)
+                time.sleep(self.MISS_REFRESH_INTERVAL)
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        info = self._symbols.get(symbol)
+        if info is None and time.time() - self.fetched_at > self.MISS_REFRESH_INTERVAL:
+            # Might be a new listing
+            self.refresh()
+            info = self._symbols.get(symbol)
+        return info
+
+    def __getitem__(self, symbol: str) -> SymbolInfo:
+        info = self.get(symbol)
+        if info is None:
+            raise KeyError(f"Unknown symbol: {symbol}")
+        return info
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    def __iter__(self):
+        return iter(self._symbols.values())
@@ -0,0 +1,641 @@
+"""
+A local stand-in for the Binance spot API, to run the bot end to end without the exchange or its testnet.
+
+It serves the REST endpoints the bot uses and the websocket streams it subscribes to on a single port,
+with prices following a random walk. Point the bot at it with `api_url` and `stream_url`, e.g.:
+
+    python -m binance_trade_bot.fake_exchange --coins "ADA XLM" --balance USDT=1000 --latency 0.05
+    API_URL=http://127.0.0.1:8800 STREAM_URL=ws://127.0.0.1:8800 python -m binance_trade_bot
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from aiohttp import WSMsgType, web
+
+# Quote assets a market symbol may end with, longest first
+QUOTE_ASSETS = ("USDT", "BUSD", "USDC", "BTC", "ETH", "BNB")
+
+
+class BinanceError(Exception):
+    def __init__(self, code: int, msg: str, status: int = 400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+class FakeOrder:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    def __init__(self, order_id: int, params: Dict[str, str], price: float):
+        self.order_id = order_id
+        self.client_order_id = params.get("newClientOrderId") or uuid.uuid4().hex[:22]
+        self.symbol = params["symbol"]
+        self.side = params["side"]
+        self.type = params["type"]
+        self.time_in_force = params.get("timeInForce", "GTC")
+        self.quantity = float(params["quantity"])
+        self.price = price
+        self.executed_qty = 0.0
+        self.quote_qty = 0.0
+        self.status = "NEW"
+        self.time = int(time.time() * 1000)
+        self.update_time = self.time
+
+    def to_json(self) -> dict:
+        return {
+            "symbol": self.symbol,
+            "orderId": self.order_id,
+            "orderListId": -1,
+            "clientOrderId": self.client_order_id,
+            "price": f"{self.price:.8f}",
+            "origQty": f"{self.quantity:.8f}",
+            "executedQty": f"{self.executed_qty:.8f}",
+            "cummulativeQuoteQty": f"{self.quote_qty:.8f}",
+            "status": self.status,
+            "timeInForce": self.time_in_force,
+            "type": self.type,
+            "side": self.side,
+            "stopPrice": "0.00000000",
+            "icebergQty": "0.00000000",
+            "time": self.time,
+            "transactTime": self.update_time,
+            "updateTime": self.update_time,
+            "isWorking": True,
+        }
+
+
+@dataclass
+class FakeExchangeSettings:  # pylint: disable=too-many-instance-attributes
+    """
+    How the fake exchange behaves.
+
+    `latency` seconds are added to every REST response and stream message. Orders fill at their limit
+    price in `fill_parts` equal parts, the first one `fill_delay` seconds after being placed and the
+    others `fill_delay` seconds apart. With a `fill_probability` below 1, some orders never fill and
+    stay open until cancelled. Prices move every `tick_interval` seconds by a random share of them with a
+    standard deviation of `volatility`.
+    """
+
+    latency: float = 0.0
+    fill_delay: float = 0.0
+    fill_parts: int = 1
+    fill_probability: float = 1.0
+    tick_interval: float = 1.0
+    volatility: float = 0.001
+    fee: float = 0.001
+    spread: float = 0.0005
+
+
+class FakeExchange:  # pylint: disable=too-many-instance-attributes
+    """
+    In-memory exchange serving Binance's REST API and websocket streams, see FakeExchangeSettings
+    """
+
+    def __init__(
+        self, prices: Dict[str, float], balances: Dict[str, float], settings: Optional[FakeExchangeSettings] = None
+    ):
+        self.markets = {symbol: _split_symbol(symbol) for symbol in prices}
+        self.prices = dict(prices)
+        self.balances = {asset: [float(free), 0.0] for asset, free in balances.items()}
+        self.settings = settings or FakeExchangeSettings()
+
+        self.orders: Dict[int, FakeOrder] = {}
+        self._order_ids = itertools.count(1)
+        self._book_update_ids = itertools.count(1)
+        self._listen_keys: Set[str] = set()
+        # Combined market stream connections and the streams each of them subscribed to
+        self._market_sockets: Dict[web.WebSocketResponse, Set[str]] = {}
+        self._user_sockets: Set[web.WebSocketResponse] = set()
+        self._weight: List[int] = [0, 0]  # minute, weight used in it
+        self._order_count: List[int] = [0, 0]  # 10 seconds window, orders placed in it
+
+        self.host: Optional[str] = None
+        self.port: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    @classmethod
+    def for_coins(
+        cls, coins: Iterable[str], bridge: str, balances: Dict[str, float], settings: FakeExchangeSettings = None
+    ) -> "FakeExchange":
+        """
+        Create an exchange listing every coin, and BNB, against the bridge at random prices
+        """
+        assets = dict.fromkeys([*coins, "BNB"])
+        prices = {asset + bridge: round(random.uniform(0.1, 100), 4) for asset in assets if asset != bridge}
+        return cls(prices, balances, settings)
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def stream_url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def _app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/api/v3/ping", self._ping)
+        app.router.add_get("/api/v3/time", self._time)
+        app.router.add_get("/api/v3/exchangeInfo", self._exchange_info)
+        app.router.add_get("/api/v3/ticker/price", self._ticker_price)
+        app.router.add_get("/api/v3/ticker/bookTicker", self._book_ticker)
+        app.router.add_get("/api/v3/account", self._account)
+        app.router.add_post("/api/v3/order", self._new_order)
+        app.router.add_get("/api/v3/order", self._get_order)
+        app.router.add_delete("/api/v3/order", self._cancel_order)
+        app.router.add_route("*", "/api/v3/userDataStream", self._user_data_stream)
+        app.router.add_get("/sapi/v1/asset/tradeFee", self._trade_fee)
+        app.router.add_get("/sapi/v1/bnbBurn", self._bnb_burn)
+        app.router.add_get("/stream", self._market_stream)
+        app.router.add_get("/ws/{listen_key}", self._user_stream)
+        return app
+
+    # Server lifecycle
+
+    def start(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Serve from a background thread, port 0 picks a free port
+        """
+        self._thread = threading.Thread(target=self._serve, args=(host, port), daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def _serve(self, host: str, port: int):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start(host, port))
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _start(self, host: str, port: int):
+        self._runner = web.AppRunner(self._app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.host, self.port = self._runner.addresses[0][:2]
+        asyncio.ensure_future(self._tick_loop())
+
+    def wait(self):
+        self._thread.join()
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def _stop():
+            # The runner waits for the websocket handlers to return, clients that are gone already won't close them
+            await self._close_sockets()
+            await self._runner.cleanup()
+
+        self._call(_stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def _call(self, coroutine):
+        # Run a coroutine on the server loop from another thread
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def set_price(self, symbol: str, price: float):
+        """
+        Move the price of a symbol and broadcast it
+        """
+
+        async def _set():
+            self.prices[symbol] = price
+            self._broadcast_tickers([symbol])
+
+        self._call(_set())
+
+    def drop_connections(self):
+        """
+        Close every websocket connection, to exercise the reconnection of the streams
+        """
+        self._call(self._close_sockets())
+
+    async def _close_sockets(self):
+        for ws in [*self._market_sockets, *self._user_sockets]:
+            await ws.close()
+
+    # REST API
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        if self.settings.latency:
+            await asyncio.sleep(self.settings.latency)
+        if request.path == "/stream" or request.path.startswith("/ws/"):
+            return await handler(request)
+        minute = int(time.time() // 60)
+        if self._weight[0] != minute:
+            self._weight = [minute, 0]
+        self._weight[1] += 1
+        try:
+            response = await handler(request)
+        except BinanceError as e:
+            response = web.json_response({"code": e.code, "msg": e.msg}, status=e.status)
+        response.headers["x-mbx-used-weight-1m"] = str(self._weight[1])
+        if request.path == "/api/v3/order" and request.method == "POST":
+            response.headers["x-mbx-order-count-10s"] = str(self._order_count[1])
+        return response
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, str]:
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        return params
+
+    def _symbol(self, params: Dict[str, str]) -> str:
+        symbol = params.get("symbol")
+        if symbol not in self.markets:
+            raise BinanceError(-1121, "Invalid symbol.")
+        return symbol
+
+    def _order(self, params: Dict[str, str]) -> FakeOrder:
+        order = self.orders.get(int(params.get("orderId", 0)))
+        if order is None or order.symbol != params.get("symbol"):
+            raise BinanceError(-2013, "Order does not exist.")
+        return order
+
+    async def _ping(self, _request):
+        return web.json_response({})
+
+    async def _time(self, _request):
+        return web.json_response({"serverTime": int(time.time() * 1000)})
+
+    async def _exchange_info(self, _request):
+        symbols = [
+            {
+                "symbol": symbol,
+                "status": "TRADING",
+                "baseAsset": base,
+                "baseAssetPrecision": 8,
+                "quoteAsset": quote,
+                "quotePrecision": 8,
+                "quoteAssetPrecision": 8,
+                "orderTypes": ["LIMIT", "MARKET"],
+                "filters": [
+                    {
+                        "filterType": "PRICE_FILTER",
+                        "minPrice": "0.00000100",
+                        "maxPrice": "1000000.00000000",
+                        "tickSize": "0.00000100",
+                    },
+                    {
+                        "filterType": "LOT_SIZE",
+                        "minQty": "0.00100000",
+                        "maxQty": "9000000.00000000",
+                        "stepSize": "0.00100000",
+                    },
+                    {
+                        "filterType": "NOTIONAL",
+                        "minNotional": "5.00000000",
+                        "applyMinToMarket": True,
+                        "maxNotional": "9000000.00000000",
+                        "applyMaxToMarket": False,
+                        "avgPriceMins": 5,
+                    },
+                ],
+            }
+            for symbol, (base, quote) in self.markets.items()
+        ]
+        return web.json_response(
+            {"timezone": "UTC", "serverTime": int(time.time() * 1000), "rateLimits": [], "symbols": symbols}
+        )
+
+    async def _ticker_price(self, request):
+        params = await self._params(request)
+        if "symbol" in params:
+            symbol = self._symbol(params)
+            return web.json_response({"symbol": symbol, "price": f"{self.prices[symbol]:.8f}"})
+        return web.json_response([{"symbol": symbol, "price": f"{price:.8f}"} for symbol, price in self.prices.items()])
+
+    def _book(self, symbol: str) -> dict:
+        bid, ask = self._bid_ask(symbol)
+        return {
+            "bidPrice": f"{bid:.8f}",
+            "bidQty": "1000.00000000",
+            "askPrice": f"{ask:.8f}",
+            "askQty": "1000.00000000",
+        }
+
+    def _bid_ask(self, symbol: str):
+        price = self.prices[symbol]
+        return price * (1 - self.settings.spread / 2), price * (1 + self.settings.spread / 2)
+
+    async def _book_ticker(self, request):
+        params = await self._params(request)
+        if "symbol" in params:
+            symbol = self._symbol(params)
+            return web.json_response({"symbol": symbol, **self._book(symbol)})
+        return web.json_response([{"symbol": symbol, **self._book(symbol)} for symbol in self.prices])
+
+    def _balances_json(self, assets: Iterable[str] = None) -> List[dict]:
+        assets = self.balances if assets is None else assets
+        return [
+            {"asset": asset, "free": f"{self.balances[asset][0]:.8f}", "locked": f"{self.balances[asset][1]:.8f}"}
+            for asset in assets
+        ]
+
+    async def _account(self, _request):
+        return web.json_response(
+            {
+                "makerCommission": 10,
+                "takerCommission": 10,
+                "canTrade": True,
+                "canWithdraw": True,
+                "canDeposit": True,
+                "updateTime": int(time.time() * 1000),
+                "accountType": "SPOT",
+                "balances": self._balances_json(),
+                "permissions": ["SPOT"],
+            }
+        )
+
+    async def _trade_fee(self, _request):
+        fee = f"{self.settings.fee:.8f}"
+        return web.json_response(
+            [{"symbol": symbol, "makerCommission": fee, "takerCommission": fee} for symbol in self.markets]
+        )
+
+    async def _bnb_burn(self, _request):
+        return web.json_response({"spotBNBBurn": False, "interestBNBBurn": False})
+
+    async def _new_order(self, request):
+        params = await self._params(request)
+        symbol = self._symbol(params)
+        if params.get("type") not in ("LIMIT", "MARKET") or params.get("side") not in ("BUY", "SELL"):
+            raise BinanceError(-1116, "Invalid orderType.")
+        if "quantity" not in params:
+            raise BinanceError(-1102, "Mandatory parameter 'quantity' was not sent, was empty/null, or malformed.")
+
+        window = int(time.time() // 10)
+        if self._order_count[0] != window:
+            self._order_count = [window, 0]
+        self._order_count[1] += 1
+
+        bid, ask = self._bid_ask(symbol)
+        price = float(params["price"]) if params["type"] == "LIMIT" else ask if params["side"] == "BUY" else bid
+        order = FakeOrder(next(self._order_ids), params, price)
+        base, quote = self.markets[symbol]
+        locked_asset, locked_qty = (quote, order.quantity * price) if order.side == "BUY" else (base, order.quantity)
+        balance = self.balances.setdefault(locked_asset, [0.0, 0.0])
+        if balance[0] < locked_qty:
+            raise BinanceError(-2010, "Account has insufficient balance for requested action.")
+        balance[0] -= locked_qty
+        balance[1] += locked_qty
+
+        self.orders[order.order_id] = order
+        self._send_execution_report(order, "NEW")
+        self._send_account_position([locked_asset])
+        if params["type"] == "MARKET":
+            self._fill(order, order.quantity)
+        elif random.random() < self.settings.fill_probability:
+            asyncio.ensure_future(self._fill_later(order))
+        return web.json_response(order.to_json())
+
+    async def _get_order(self, request):
+        params = await self._params(request)
+        return web.json_response(self._order(params).to_json())
+
+    async def _cancel_order(self, request):
+        params = await self._params(request)
+        order = self._order(params)
+        if order.status not in ("NEW", "PARTIALLY_FILLED"):
+            raise BinanceError(-2011, "Unknown order sent.")
+        base, quote = self.markets[order.symbol]
+        remaining = order.quantity - order.executed_qty
+        locked_asset, locked_qty = (quote, remaining * order.price) if order.side == "BUY" else (base, remaining)
+        balance = self.balances[locked_asset]
+        balance[0] += locked_qty
+        balance[1] -= locked_qty
+        order.status = "CANCELED"
+        order.update_time = int(time.time() * 1000)
+        self._send_execution_report(order, "CANCELED")
+        self._send_account_position([locked_asset])
+        return web.json_response(order.to_json())
+
+    async def _fill_later(self, order: FakeOrder):
+        fill_parts = max(1, self.settings.fill_parts)
+        part = order.quantity / fill_parts
+        for i in range(fill_parts):
+            await asyncio.sleep(self.settings.fill_delay)
+            if order.status not in ("NEW", "PARTIALLY_FILLED"):
+                return
+            # The last part takes whatever rounding left over
+            self._fill(order, part if i < fill_parts - 1 else order.quantity - order.executed_qty)
+
+    def _fill(self, order: FakeOrder, quantity: float):
+        base, quote = self.markets[order.symbol]
+        quote_qty = quantity * order.price
+        if order.side == "BUY":
+            self.balances[quote][1] -= quote_qty
+            self.balances.setdefault(base, [0.0, 0.0])[0] += quantity * (1 - self.settings.fee)
+            commission, commission_asset = quantity * self.settings.fee, base
+        else:
+            self.balances[base][1] -= quantity
+            self.balances.setdefault(quote, [0.0, 0.0])[0] += quote_qty * (1 - self.settings.fee)
+            commission, commission_asset = quote_qty * self.settings.fee, quote
+        order.executed_qty += quantity
+        order.quote_qty += quote_qty
+        order.status = "FILLED" if order.executed_qty >= order.quantity - 1e-12 else "PARTIALLY_FILLED"
+        order.update_time = int(time.time() * 1000)
+        self._send_execution_report(order, "TRADE", quantity, commission, commission_asset)
+        self._send_account_position([base, quote])
+
+    async def _user_data_stream(self, request):
+        if request.method == "POST":
+            listen_key = uuid.uuid4().hex
+            self._listen_keys.add(listen_key)
+            return web.json_response({"listenKey": listen_key})
+        return web.json_response({})
+
+    # Websocket streams
+
+    async def _send(self, ws: web.WebSocketResponse, message: dict):
+        if self.settings.latency:
+            await asyncio.sleep(self.settings.latency)
+        if not ws.closed:
+            await ws.send_str(json.dumps(message))
+
+    def _publish(self, ws: web.WebSocketResponse, message: dict):
+        asyncio.ensure_future(self._send(ws, message))
+
+    async def _market_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = set(filter(None, request.query.get("streams", "").split("/")))
+        self._market_sockets[ws] = streams
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                method, params = payload.get("method"), payload.get("params", [])
+                result = None
+                if method == "SUBSCRIBE":
+                    streams.update(params)
+                elif method == "UNSUBSCRIBE":
+                    streams.difference_update(params)
+                elif method == "LIST_SUBSCRIPTIONS":
+                    result = sorted(streams)
+                self._publish(ws, {"result": result, "id": payload.get("id")})
+        finally:
+            del self._market_sockets[ws]
+        return ws
+
+    async def _user_stream(self, request):
+        if request.match_info["listen_key"] not in self._listen_keys:
+            raise web.HTTPBadRequest()
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._user_sockets.add(ws)
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self._user_sockets.discard(ws)
+        return ws
+
+    def _send_user_event(self, event: dict):
+        for ws in self._user_sockets:
+            self._publish(ws, event)
+
+    def _send_execution_report(
+        self, order: FakeOrder, execution_type: str, last_qty=0.0, commission=0.0, commission_asset=None
+    ):
+        now = int(time.time() * 1000)
+        self._send_user_event(
+            {
+                "e": "executionReport",
+                "E": now,
+                "s": order.symbol,
+                "c": order.client_order_id,
+                "S": order.side,
+                "o": order.type,
+                "f": order.time_in_force,
+                "q": f"{order.quantity:.8f}",
+                "p": f"{order.price:.8f}",
+                "P": "0.00000000",
+                "F": "0.00000000",
+                "g": -1,
+                "C": order.client_order_id if execution_type == "CANCELED" else "",
+                "x": execution_type,
+                "X": order.status,
+                "r": "NONE",
+                "i": order.order_id,
+                "l": f"{last_qty:.8f}",
+                "z": f"{order.executed_qty:.8f}",
+                "L": f"{order.price if last_qty else 0:.8f}",
+                "n": f"{commission:.8f}",
+                "N": commission_asset,
+                "T": order.update_time,
+                "t": next(self._book_update_ids) if last_qty else -1,
+                "I": 0,
+                "w": order.status in ("NEW", "PARTIALLY_FILLED"),
+                "m": False,
+                "M": bool(last_qty),
+                "O": order.time,
+                "Z": f"{order.quote_qty:.8f}",
+                "Y": f"{last_qty * order.price:.8f}",
+                "Q": "0.00000000",
+            }
+        )
+
+    def _send_account_position(self, assets: Iterable[str]):
+        now = int(time.time() * 1000)
+        balances = [{"a": b["asset"], "f": b["free"], "l": b["locked"]} for b in self._balances_json(assets)]
+        self._send_user_event({"e": "outboundAccountPosition", "E": now, "u": now, "B": balances})
+
+    def _broadcast_tickers(self, symbols: Iterable[str]):
+        now = int(time.time() * 1000)
+        for symbol in symbols:
+            price = f"{self.prices[symbol]:.8f}"
+            mini_ticker_stream = f"{symbol.lower()}@miniTicker"
+            mini_ticker = {
+                "e": "24hrMiniTicker",
+                "E": now,
+                "s": symbol,
+                "c": price,
+                "o": price,
+                "h": price,
+                "l": price,
+                "v": "0",
+                "q": "0",
+            }
+            book_ticker_stream = f"{symbol.lower()}@bookTicker"
+            book_ticker = {"u": next(self._book_update_ids), "s": symbol, **_short_book(self._book(symbol))}
+            for ws, streams in self._market_sockets.items():
+                if mini_ticker_stream in streams:
+                    self._publish(ws, {"stream": mini_ticker_stream, "data": mini_ticker})
+                if book_ticker_stream in streams:
+                    self._publish(ws, {"stream": book_ticker_stream, "data": book_ticker})
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.settings.tick_interval)
+            for symbol, price in self.prices.items():
+                self.prices[symbol] = price * (1 + random.gauss(0, self.settings.volatility))
+            self._broadcast_tickers(self.prices)
+
+
+def _split_symbol(symbol: str):
+    for quote in QUOTE_ASSETS:
+        if symbol.endswith(quote) and symbol != quote:
+            return symbol[: -len(quote)], quote
+    raise ValueError(f"Can't tell the quote asset of {symbol}")
+
+
+def _short_book(book: dict) -> dict:
+    return {"b": book["bidPrice"], "B": book["bidQty"], "a": book["askPrice"], "A": book["askQty"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Binance exchange locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--coins", required=True, help="Space separated coins to list against the bridge")
+    parser.add_argument("--bridge", default="USDT")
+    parser.add_argument("--balance", action="append", default=[], help="Initial balance as ASSET=AMOUNT")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds added to every response and message")
+    parser.add_argument("--fill-delay", type=float, default=0, help="Seconds before an order fills")
+    parser.add_argument("--fill-parts", type=int, default=1, help="Number of partial fills per order")
+    parser.add_argument("--fill-probability", type=float, default=1, help="Share of limit orders that fill")
+    parser.add_argument("--tick-interval", type=float, default=1, help="Seconds between two price updates")
+    parser.add_argument("--volatility", type=float, default=0.001, help="Standard deviation of a price move")
+    args = parser.parse_args()
+
+    balances = {asset: float(amount) for asset, amount in (balance.split("=") for balance in args.balance)}
+    exchange = FakeExchange.for_coins(
+        args.coins.split(),
+        args.bridge,
+        balances,
+        FakeExchangeSettings(
+            latency=args.latency,
+            fill_delay=args.fill_delay,
+            fill_parts=args.fill_parts,
+            fill_probability=args.fill_probability,
+            tick_interval=args.tick_interval,
+            volatility=args.volatility,
+        ),
+    )
+    exchange.start(args.host, args.port)
+    print(f"Serving on {exchange.api_url} (REST) and {exchange.stream_url} (streams)")
+    try:
+        exchange.wait()
+    except KeyboardInterrupt:
+        exchange.stop()
+
+
+if __name__ == "__main__":
+    main()
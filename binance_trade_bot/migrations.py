@@ -0,0 +1,113 @@
+"""
+In-place migrations of existing SQLite databases.
+
+`create_all` only creates the tables that don't exist yet, changes to existing tables go here. The version
+of a database's schema is kept in its `user_version` pragma. Every migration brings the schema from the
+version at its index to the next one, so new migrations are only ever appended. A new database is created
+at the latest version by `create_all` and doesn't go through them.
+"""
+from typing import Callable, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .logger import Logger
+
+
+def get_schema_version(connection: Connection) -> int:
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def set_schema_version(connection: Connection, version: int):
+    connection.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+def _columns(connection: Connection, table: str) -> dict:
+    return {row[1]: row[2] for row in connection.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _add_column(connection: Connection, table: str, column: str, column_type: str):
+    if column not in _columns(connection, table):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+
+
+def _add_jump_latency(connection: Connection):
+    _add_column(connection, "trade_history", "jump_latency", "FLOAT")
+
+
+def _index_history_tables(connection: Connection):
+    # scout_history.pair_id was declared as a string, SQLite can't change the type of a column
+    if _columns(connection, "scout_history").get("pair_id") != "INTEGER":
+        connection.execute(text("ALTER TABLE scout_history RENAME TO scout_history_old"))
+        connection.execute(
+            text(
+                "CREATE TABLE scout_history ("
+                "id INTEGER NOT NULL, "
+                "pair_id INTEGER, "
+                "target_ratio FLOAT, "
+                "current_coin_price FLOAT, "
+                "other_coin_price FLOAT, "
+                "datetime DATETIME, "
+                "PRIMARY KEY (id), "
+                "FOREIGN KEY(pair_id) REFERENCES pairs (id))"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO scout_history "
+                "SELECT id, CAST(pair_id AS INTEGER), target_ratio, current_coin_price, other_coin_price, datetime "
+                "FROM scout_history_old"
+            )
+        )
+        connection.execute(text("DROP TABLE scout_history_old"))
+
+    for index, table, columns in (
+        ("ix_scout_history_datetime", "scout_history", "datetime"),
+        ("ix_scout_history_pair_id_datetime", "scout_history", "pair_id, datetime"),
+        ("ix_coin_value_datetime", "coin_value", "datetime"),
+        ("ix_coin_value_coin_id_datetime", "coin_value", "coin_id, datetime"),
+        ("ix_coin_value_interval_datetime", "coin_value", "interval, datetime"),
+        ("ix_current_coin_history_datetime", "current_coin_history", "datetime"),
+        ("ix_trade_history_datetime", "trade_history", "datetime"),
+    ):
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})"))
+
+
+def _materialize_pair_enabled(connection: Connection):
+    # Pair.enabled used to be computed by a subquery on every read
+    _add_column(connection, "pairs", "enabled", "BOOLEAN")
+    connection.execute(
+        text(
+            "UPDATE pairs SET enabled = ("
+            "SELECT count(*) FROM coins WHERE coins.enabled AND coins.symbol IN (pairs.from_coin_id, pairs.to_coin_id)"
+            ") = 2"
+        )
+    )
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_pairs_enabled ON pairs (enabled)"))
+
+
+def _partition_scout_history(connection: Connection):
+    # scout_history becomes a view over hourly partitions, ScoutHistoryStore moves the rows over
+    if connection.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scout_history'")).first():
+        connection.execute(text("ALTER TABLE scout_history RENAME TO scout_history_legacy"))
+
+
+MIGRATIONS: List[Callable[[Connection], None]] = [
+    _add_jump_latency,
+    _index_history_tables,
+    _materialize_pair_enabled,
+    _partition_scout_history,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(connection: Connection, logger: Logger):
+    """
+    Apply the migrations the database hasn't been through yet
+    """
+    version = get_schema_version(connection)
+    for target_version, migration in enumerate(MIGRATIONS[version:], version + 1):
+        logger.info(f"Migrating database schema to version {target_version}")
+        migration(connection)
+        set_schema_version(connection, target_version)
@@ -1,6 +1,6 @@
 from .base import Base
 from .coin import Coin
-from .coin_value import CoinValue, Interval
+from .coin_value import CoinValue, CoinValueRollup, Interval
 from .current_coin import CurrentCoin
 from .pair import Pair
 from .scout_history import ScoutHistory
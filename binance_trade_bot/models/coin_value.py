@@ -1,7 +1,7 @@
 import enum
 from datetime import datetime as _datetime
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
@@ -30,7 +30,12 @@ class CoinValue(Base):
 
     interval = Column(Enum(Interval))
 
-    datetime = Column(DateTime)
+    datetime = Column(DateTime, index=True)
+
+    __table_args__ = (
+        Index("ix_coin_value_coin_id_datetime", coin_id, datetime),
+        Index("ix_coin_value_interval_datetime", interval, datetime),
+    )
 
     def __init__(
         self,
@@ -75,3 +80,17 @@ class CoinValue(Base):
             "btc_value": self.btc_value,
             "datetime": self.datetime.isoformat(),
         }
+
+
+class CoinValueRollup(Base):  # pylint: disable=too-few-public-methods
+    """
+    Single row table holding the time up to which coin values have been rolled up into the coarser intervals
+    """
+
+    __tablename__ = "coin_value_rollup"
+
+    id = Column(Integer, primary_key=True)
+    watermark = Column(DateTime)
+
+    def __init__(self, watermark: _datetime):
+        self.watermark = watermark
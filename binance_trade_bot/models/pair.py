@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, func, or_, select
-from sqlalchemy.orm import column_property, relationship
+from sqlalchemy import Boolean, Column, Float, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
 
 from .base import Base
 from .coin import Coin
@@ -18,17 +18,14 @@ class Pair(Base):
 
     ratio = Column(Float)
 
-    enabled = column_property(
-        select([func.count(Coin.symbol) == 2])
-        .where(or_(Coin.symbol == from_coin_id, Coin.symbol == to_coin_id))
-        .where(Coin.enabled.is_(True))
-        .scalar_subquery()
-    )
+    # Whether both coins are enabled, maintained by Database.set_coins
+    enabled = Column(Boolean, index=True)
 
-    def __init__(self, from_coin: Coin, to_coin: Coin, ratio=None):
+    def __init__(self, from_coin: Coin, to_coin: Coin, ratio=None, enabled=True):
         self.from_coin = from_coin
         self.to_coin = to_coin
         self.ratio = ratio
+        self.enabled = enabled
 
     def __repr__(self):
         return f"<{self.from_coin_id}->{self.to_coin_id} :: {self.ratio}>"
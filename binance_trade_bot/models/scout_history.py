@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
@@ -9,11 +9,13 @@ from .pair import Pair
 
 
 class ScoutHistory(Base):
+    # A read-only view over the hourly partitions of ScoutHistoryStore, not created by create_all
     __tablename__ = "scout_history"
+    __table_args__ = {"info": {"view": True}}
 
     id = Column(Integer, primary_key=True)
 
-    pair_id = Column(String, ForeignKey("pairs.id"))
+    pair_id = Column(Integer, ForeignKey("pairs.id"))
     pair = relationship("Pair")
 
     target_ratio = Column(Float)
@@ -34,7 +34,10 @@ class Trade(Base):  # pylint: disable=too-few-public-methods
     crypto_starting_balance = Column(Float)
     crypto_trade_amount = Column(Float)
 
-    datetime = Column(DateTime)
+    # Seconds between the start of a jump and its buy order being placed
+    jump_latency = Column(Float)
+
+    datetime = Column(DateTime, index=True)
 
     def __init__(self, alt_coin: Coin, crypto_coin: Coin, selling: bool):
         self.alt_coin = alt_coin
@@ -54,5 +57,6 @@ class Trade(Base):  # pylint: disable=too-few-public-methods
             "alt_trade_amount": self.alt_trade_amount,
             "crypto_starting_balance": self.crypto_starting_balance,
             "crypto_trade_amount": self.crypto_trade_amount,
+            "jump_latency": self.jump_latency,
             "datetime": self.datetime.isoformat(),
         }
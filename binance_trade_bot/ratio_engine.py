@@ -0,0 +1,139 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import Config
+from .models import Coin, Pair
+
+
+class RatioEngine:
+    """
+    In-memory scouting state: the target ratio of every enabled pair as an N×N matrix, and the
+    latest bridge price and fee of every enabled coin as vectors, all indexed by coin.
+
+    This allows computing the scouting ratios of one coin (or of every coin at once) in a single
+    vectorized pass instead of looping over every pair.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.coins: List[Coin] = []
+        self.index: Dict[str, int] = {}
+        self.price_symbols: Tuple[str, ...] = ()
+        self.pairs: Dict[Tuple[int, int], Pair] = {}
+        self.ratios = np.empty((0, 0))
+        self.prices = np.empty(0)
+        self.sell_fees = np.empty(0)
+        self.buy_fees = np.empty(0)
+
+    def load(self, coins: List[Coin], pairs: List[Pair]):
+        """
+        (Re)build the matrix from the enabled coins and pairs
+        """
+        n = len(coins)
+        self.coins = list(coins)
+        self.index = {coin.symbol: i for i, coin in enumerate(self.coins)}
+        self.price_symbols = tuple(coin.symbol + self.config.BRIDGE.symbol for coin in self.coins)
+        self.pairs = {}
+        self.ratios = np.full((n, n), np.nan)
+        self.prices = np.full(n, np.nan)
+        self.sell_fees = np.full(n, np.nan)
+        self.buy_fees = np.full(n, np.nan)
+
+        for pair in pairs:
+            i = self.index.get(pair.from_coin_id)
+            j = self.index.get(pair.to_coin_id)
+            if i is None or j is None or i == j:
+                continue
+            self.pairs[(i, j)] = pair
+            if pair.ratio is not None:
+                self.ratios[i, j] = pair.ratio
+
+    def set_ratio(self, from_symbol: str, to_symbol: str, ratio: float):
+        i = self.index.get(from_symbol)
+        j = self.index.get(to_symbol)
+        if i is None or j is None or i == j:
+            return
+        self.ratios[i, j] = np.nan if ratio is None else ratio
+        pair = self.pairs.get((i, j))
+        if pair is not None:
+            pair.ratio = ratio
+
+    def pairs_from(self, symbol: str) -> List[Tuple[int, Pair]]:
+        """
+        Get the enabled pairs starting from the given coin, along with the index of their target coin
+        """
+        i = self.index.get(symbol)
+        if i is None:
+            return []
+        return [(j, pair) for (from_index, j), pair in self.pairs.items() if from_index == i]
+
+    def update_prices(self, get_prices: Callable[[Sequence[str]], np.ndarray]):
+        """
+        Refresh the price vector, coins without a bridge market get NaN
+        """
+        self.prices = np.asarray(get_prices(self.price_symbols), dtype=float)
+
+    def update_fees(self, get_fee: Callable[[Coin, Coin, bool], float], sell_symbols: Iterable[str]):
+        """
+        Refresh the buy fee of every priced coin and the sell fee of the given coins
+        """
+        priced = ~np.isnan(self.prices)
+        self.buy_fees = np.array(
+            [get_fee(coin, self.config.BRIDGE, False) if priced[i] else np.nan for i, coin in enumerate(self.coins)],
+            dtype=float,
+        )
+        for symbol in sell_symbols:
+            i = self.index.get(symbol)
+            if i is not None and priced[i]:
+                self.sell_fees[i] = get_fee(self.coins[i], self.config.BRIDGE, True)
+
+    def scout(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Compute the scouting ratio from each coin in `rows` to every other coin. Missing prices, fees or
+        target ratios, as well as the diagonal, result in NaN.
+        """
+        prices = self.prices[rows, None]
+        sell_fees = self.sell_fees[rows, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Obtain (current coin)/(optional coin)
+            coin_opt_coin_ratio = prices / self.prices[None, :]
+            transaction_fee = sell_fees + self.buy_fees[None, :] - sell_fees * self.buy_fees[None, :]
+
+            if self.config.USE_MARGIN == "yes":
+                result = (
+                    (1 - transaction_fee) * coin_opt_coin_ratio / self.ratios[rows] - 1 - self.config.SCOUT_MARGIN / 100
+                )
+            else:
+                result = (
+                    coin_opt_coin_ratio - transaction_fee * self.config.SCOUT_MULTIPLIER * coin_opt_coin_ratio
+                ) - self.ratios[rows]
+
+        result[np.arange(len(rows)), rows] = np.nan
+        return result
+
+    def scout_from(self, symbol: str, coin_price: float = None) -> Optional[np.ndarray]:
+        """
+        Compute the scouting ratios from one coin to every other coin
+        """
+        i = self.index.get(symbol)
+        if i is None:
+            return None
+        if coin_price is not None:
+            self.prices[i] = coin_price
+        return self.scout(np.array([i]))[0]
+
+    def scout_all(self) -> np.ndarray:
+        """
+        Compute the whole N×N scouting ratio matrix
+        """
+        return self.scout(np.arange(len(self.coins)))
+
+    def best_pair(self, symbol: str, ratios: np.ndarray) -> Optional[Pair]:
+        """
+        Get the pair with the biggest positive scouting ratio, if any
+        """
+        i = self.index.get(symbol)
+        if i is None or not np.any(ratios > 0):
+            return None
+        return self.pairs.get((i, int(np.nanargmax(ratios))))
@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+
+import requests
+from binance.client import Client
+from requests.adapters import HTTPAdapter
+
+# Request priorities, lower goes first
+PRIORITY_ORDER = 0
+PRIORITY_READ = 1
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30) -> float:
+    """
+    Exponential backoff with full jitter, for retrying the `attempt`-th time (starting at 0)
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class RequestScheduler:
+    """
+    Keeps track of the request weight and order count Binance reports in its response headers,
+    and holds requests back before the limits are hit.
+
+    Order placement and cancellation have priority over reads: reads stop once the used weight
+    enters the reserved share of the limit and always yield to waiting orders, while orders are
+    only held back at the hard limits.
+    """
+
+    def __init__(self, weight_limit=1200, order_limit=50, read_reserve=0.2):
+        self.weight_limit = weight_limit
+        self.order_limit = order_limit
+        self.read_weight_limit = weight_limit * (1 - read_reserve)
+
+        self.used_weight = 0
+        self.order_count = 0
+        self._weight_window = 0
+        self._order_window = 0
+        self._blocked_until = 0.0
+        self._waiting_orders = 0
+        self._condition = threading.Condition()
+
+    def _wait_time(self, priority: int, now: float) -> float:
+        """
+        Seconds until a request of the given priority may be sent, 0 if it can go right away
+        """
+        # Weights are counted per minute, order counts per 10 seconds
+        weight_window = int(now // 60)
+        if weight_window != self._weight_window:
+            self._weight_window = weight_window
+            self.used_weight = 0
+        order_window = int(now // 10)
+        if order_window != self._order_window:
+            self._order_window = order_window
+            self.order_count = 0
+
+        # The request waits for the last of the limits holding it back
+        waits = [self._blocked_until - now]
+        if priority == PRIORITY_ORDER:
+            weight_limit = self.weight_limit
+            if self.order_count >= self.order_limit:
+                waits.append((order_window + 1) * 10 - now)
+        else:
+            weight_limit = self.read_weight_limit
+            if self._waiting_orders:
+                waits.append(0.05)
+        if self.used_weight >= weight_limit:
+            waits.append((weight_window + 1) * 60 - now)
+        return max(0, *waits)
+
+    def acquire(self, priority: int):
+        """
+        Block until a request of the given priority may be sent
+        """
+        with self._condition:
+            if priority == PRIORITY_ORDER:
+                self._waiting_orders += 1
+            try:
+                while True:
+                    wait_time = self._wait_time(priority, time.time())
+                    if wait_time <= 0:
+                        return
+                    self._condition.wait(wait_time)
+            finally:
+                if priority == PRIORITY_ORDER:
+                    self._waiting_orders -= 1
+                    self._condition.notify_all()
+
+    def update(self, response: requests.Response):
+        """
+        Record the limits usage reported by a response
+        """
+        headers = response.headers
+        now = time.time()
+        with self._condition:
+            used_weight = headers.get("x-mbx-used-weight-1m")
+            if used_weight is not None:
+                self._weight_window = int(now // 60)
+                self.used_weight = int(used_weight)
+            order_count = headers.get("x-mbx-order-count-10s")
+            if order_count is not None:
+                self._order_window = int(now // 10)
+                self.order_count = int(order_count)
+            if response.status_code in (418, 429):
+                # Rate limited (or banned for ignoring it), nothing may be sent until told otherwise
+                retry_after = float(headers.get("Retry-After", 60))
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._condition.notify_all()
+
+
+class ScheduledClient(Client):
+    """
+    Binance client sending its requests through a RequestScheduler, over a pool of kept-alive connections
+    """
+
+    def __init__(self, *args, scheduler: RequestScheduler = None, pool_size=10, api_url: str = None, **kwargs):
+        self.scheduler = scheduler or RequestScheduler()
+        self.pool_size = pool_size
+        if api_url:
+            # Set before the constructor pings the API, the base client formats these without placeholders as is
+            api_url = api_url.rstrip("/")
+            self.API_URL = self.API_TESTNET_URL = f"{api_url}/api"
+            self.MARGIN_API_URL = f"{api_url}/sapi"
+        super().__init__(*args, **kwargs)
+
+    def _init_session(self) -> requests.Session:
+        session = super()._init_session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
+        priority = PRIORITY_READ
+        if method in ("post", "delete") and uri.split("?")[0].endswith("/order"):
+            priority = PRIORITY_ORDER
+        self.scheduler.acquire(priority)
+        return super()._request(method, uri, signed, force_params, **kwargs)
+
+    def _handle_response(self, response: requests.Response):  # pylint: disable=arguments-differ
+        self.scheduler.update(response)
+        return Client._handle_response(response)
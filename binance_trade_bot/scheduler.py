@@ -31,3 +31,9 @@ class SafeScheduler(Scheduler):
                 # letting it run
                 # next tick
                 job._schedule_next_run()  # pylint: disable=protected-access
+
+    def run_now(self, job: Job):
+        """
+        Run a job immediately, outside of its schedule, with the same error handling
+        """
+        self._run_job(job)
@@ -0,0 +1,137 @@
+import math
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, Table, select, text
+from sqlalchemy.engine import Connection
+
+from .logger import Logger
+
+SLOT_TABLE_PATTERN = re.compile(r"^scout_history_(\d+)$")
+LEGACY_TABLE = "scout_history_legacy"
+
+
+def _hour(value: datetime) -> int:
+    # Scout history datetimes are naive UTC
+    return int(value.replace(tzinfo=timezone.utc).timestamp() // 3600)
+
+
+class ScoutHistoryStore:
+    """
+    Scout history kept in a ring of hourly partitions: `slot_count` identical tables, the rows of hour h
+    going to table h % slot_count. There are just enough slots to hold the retention period, so a slot is
+    only ever reused once the hour it held has expired. Expiring an hour empties its table in one go,
+    and the pages it frees are reused by the next hours, so the file doesn't grow or fragment.
+
+    The `scout_history` view unions the slots for readers.
+    """
+
+    def __init__(self, retention_hours: float, logger: Logger):
+        self.retention_hours = retention_hours
+        self.logger = logger
+        self.slot_count = math.ceil(retention_hours) + 1
+        self.metadata = MetaData()
+        self.slots = [self._slot_table(slot) for slot in range(self.slot_count)]
+        # The hour each slot currently holds, NULL when empty
+        self.slot_hours = Table(
+            "scout_history_slots",
+            self.metadata,
+            Column("slot", Integer, primary_key=True),
+            Column("hour", Integer),
+        )
+
+    def _slot_table(self, slot: int) -> Table:
+        name = f"scout_history_{slot}"
+        return Table(
+            name,
+            self.metadata,
+            Column("id", Integer, primary_key=True),
+            Column("pair_id", Integer),
+            Column("target_ratio", Float),
+            Column("current_coin_price", Float),
+            Column("other_coin_price", Float),
+            Column("datetime", DateTime),
+            Index(f"ix_{name}_datetime", "datetime"),
+            Index(f"ix_{name}_pair_id_datetime", "pair_id", "datetime"),
+        )
+
+    def create(self, connection: Connection):
+        """
+        Create the slots and the view, rebuilding them if the number of slots changed with the retention
+        """
+        existing_slots = {
+            name
+            for (name,) in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+            if SLOT_TABLE_PATTERN.match(name)
+        }
+        if existing_slots and existing_slots != {slot.name for slot in self.slots}:
+            self.logger.info(f"Scout history retention changed, clearing it to use {self.slot_count} hourly slots")
+            connection.execute(text("DROP VIEW IF EXISTS scout_history"))
+            for name in existing_slots:
+                connection.execute(text(f"DROP TABLE {name}"))
+            connection.execute(text("DROP TABLE IF EXISTS scout_history_slots"))
+
+        self.metadata.create_all(connection)
+        connection.execute(
+            self.slot_hours.insert().prefix_with("OR IGNORE"),
+            [{"slot": slot, "hour": None} for slot in range(self.slot_count)],
+        )
+        columns = "pair_id, target_ratio, current_coin_price, other_coin_price, datetime"
+        union = " UNION ALL ".join(
+            f"SELECT id * {self.slot_count} + {slot} AS id, {columns} FROM scout_history_{slot}"
+            for slot in range(self.slot_count)
+        )
+        connection.execute(text(f"CREATE VIEW IF NOT EXISTS scout_history AS {union}"))
+        self._import_legacy(connection)
+
+    def _import_legacy(self, connection: Connection):
+        # Rows of the scout_history table from before it was partitioned, see migrations
+        if not connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": LEGACY_TABLE}
+        ).first():
+            return
+        legacy = Table(LEGACY_TABLE, MetaData(), autoload_with=connection)
+        columns = ("pair_id", "target_ratio", "current_coin_price", "other_coin_price", "datetime")
+        rows = [{column: row[column] for column in columns} for row in connection.execute(select(legacy)).mappings()]
+        self.logger.info(f"Moving {len(rows)} scout history rows to hourly slots")
+        self.insert(connection, rows)
+        self.prune(connection, datetime.utcnow())
+        connection.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+
+    def _get_slot_hours(self, connection: Connection) -> Dict[int, int]:
+        return dict(connection.execute(select(self.slot_hours.c.slot, self.slot_hours.c.hour)).fetchall())
+
+    def _clear_slot(self, connection: Connection, slot: int, hour=None):
+        # Without a WHERE clause SQLite drops the table's pages at once instead of deleting row by row
+        connection.execute(self.slots[slot].delete())
+        connection.execute(self.slot_hours.update().where(self.slot_hours.c.slot == slot).values(hour=hour))
+
+    def insert(self, connection: Connection, rows: List[dict]):
+        """
+        Write rows to the slots of their hours, taking over slots that still hold an expired hour
+        """
+        rows_by_hour = defaultdict(list)
+        for row in rows:
+            rows_by_hour[_hour(row["datetime"])].append(row)
+        slot_hours = self._get_slot_hours(connection)
+        for hour, hour_rows in sorted(rows_by_hour.items()):
+            slot = hour % self.slot_count
+            slot_hour = slot_hours.get(slot)
+            if slot_hour is not None and slot_hour > hour:
+                # The slot already moved on to a later hour, these rows are past retention
+                continue
+            if slot_hour != hour:
+                self._clear_slot(connection, slot, hour)
+                slot_hours[slot] = hour
+            connection.execute(self.slots[slot].insert(), hour_rows)
+
+    def prune(self, connection: Connection, now: datetime):
+        """
+        Empty the slots whose whole hour is older than the retention period
+        """
+        expired_before = now.replace(tzinfo=timezone.utc).timestamp() / 3600 - self.retention_hours
+        for slot, hour in self._get_slot_hours(connection).items():
+            if hour is not None and hour + 1 <= expired_before:
+                self._clear_slot(connection, slot)
@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+
+# Events worth replaying to reproduce the market and the fills of our orders
+RECORDED_EVENTS = ("24hrMiniTicker", "bookTicker", "executionReport")
+
+# zlib window bits selecting the gzip container
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+READ_SIZE = 1024 * 1024
+
+
+def _read_members(f: BinaryIO) -> Iterator[Tuple[bytes, int]]:
+    """
+    Yield the decompressed content of every complete gzip member of a file, with the offset it ends at.
+    Stops at the first member that is truncated or corrupted.
+    """
+    end = 0
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    content: List[bytes] = []
+    while True:
+        chunk = f.read(READ_SIZE)
+        if not chunk:
+            return
+        while chunk:
+            try:
+                content.append(decompressor.decompress(chunk))
+            except zlib.error:
+                return
+            if not decompressor.eof:
+                end += len(chunk)
+                break
+            rest = decompressor.unused_data
+            end += len(chunk) - len(rest)
+            yield b"".join(content), end
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+            content = []
+            chunk = rest
+
+
+class StreamRecorder:
+    """
+    Appends stream events, along with the time they were received at, to a gzip compressed file of JSON
+    lines. Events are buffered and written as a complete gzip member by a thread flushing every
+    FLUSH_INTERVAL seconds, so an interrupted run only loses the events of its last flush interval, however
+    quiet the stream is. A member left truncated by a crash is cut off when the
+    file is opened again, before the new run appends to it.
+    """
+
+    # Seconds between two flushes of the buffered events to the file
+    FLUSH_INTERVAL = 5
+
+    def __init__(self, path: str, events=RECORDED_EVENTS):
+        self.path = path
+        self.events = frozenset(events)
+        self.recorded = 0
+        self._truncate_incomplete_member()
+        self._file = open(path, "ab")  # pylint: disable=consider-using-with
+        self._lines: List[str] = []
+        self._mutex = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _truncate_incomplete_member(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as f:
+            end = 0
+            for _, end in _read_members(f):
+                pass
+            if end < os.fstat(f.fileno()).st_size:
+                f.truncate(end)
+
+    def record(self, received_at: float, stream_data: dict):
+        """
+        Record an event received at the given wall clock time, if it is of a recorded type
+        """
+        if stream_data.get("event_type") not in self.events:
+            return
+        line = json.dumps([round(received_at, 6), stream_data], separators=(",", ":"))
+        with self._mutex:
+            self._lines.append(line + "\n")
+            self.recorded += 1
+
+    def _run(self):
+        while not self._stop.wait(self.FLUSH_INTERVAL):
+            with self._mutex:
+                self._flush()
+
+    def _flush(self):
+        if not self._lines:
+            return
+        self._file.write(gzip.compress("".join(self._lines).encode("utf-8")))
+        self._file.flush()
+        self._lines = []
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        with self._mutex:
+            self._flush()
+            self._file.close()
+
+
+class StreamReplayer:
+    """
+    Reads back a file written by StreamRecorder, up to a truncated tail left by an interrupted run
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[Tuple[float, dict]]:
+        with open(self.path, "rb") as f:
+            for content, _ in _read_members(f):
+                for line in content.decode("utf-8").splitlines():
+                    received_at, stream_data = json.loads(line)
+                    yield received_at, stream_data
+
+    def replay(self, process: Callable[[dict], None], speed: float = 1.0) -> int:
+        """
+        Feed the recorded events to `process` with their original spacing divided by `speed`, 0 feeds them
+        as fast as possible. Returns the number of events replayed.
+        """
+        count = 0
+        first_received_at = None
+        started_at = time.monotonic()
+        for received_at, stream_data in self:
+            if first_received_at is None:
+                first_received_at = received_at
+            if speed:
+                delay = started_at + (received_at - first_received_at) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            process(stream_data)
+            count += 1
+        return count
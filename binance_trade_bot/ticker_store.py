@@ -0,0 +1,140 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Quote assets whose markets are tracked for every supported coin
+TRACKED_QUOTES = ("BTC", "USDT", "BNB")
+
+
+def tracked_symbols(coins: Iterable[str], bridge: str) -> List[str]:
+    """
+    Get the market symbols the bot may need a price for: every coin (and quote asset) against the bridge
+    and the other quote assets. Combinations that aren't listed on the exchange simply never get a price.
+    """
+    quotes = [bridge] + [quote for quote in TRACKED_QUOTES if quote != bridge]
+    bases = list(dict.fromkeys([*coins, *quotes]))
+    return [base + quote for base in bases for quote in quotes if base != quote]
+
+
+class TickerStore:
+    """
+    Latest price and update time of a fixed set of symbols, kept in preallocated arrays indexed by
+    slot. Updates for symbols outside of the set are ignored, and the prices of many symbols can be
+    read as a vector in a single indexing operation.
+    """
+
+    def __init__(self, symbols: Iterable[str] = ()):
+        self._mutex = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        # One extra slot that always stays NaN, untracked symbols read from it
+        self.prices = np.full(1, np.nan)
+        self.updated_at = np.zeros(1)
+        self._vectors: Dict[Tuple[str, ...], np.ndarray] = {}
+        self.set_symbols(symbols)
+
+    def set_symbols(self, symbols: Iterable[str]):
+        """
+        Track exactly the given symbols, keeping the prices of those already tracked
+        """
+        symbols = list(dict.fromkeys(symbols))
+        with self._mutex:
+            prices = np.full(len(symbols) + 1, np.nan)
+            updated_at = np.zeros(len(symbols) + 1)
+            for slot, symbol in enumerate(symbols):
+                old_slot = self._slots.get(symbol)
+                if old_slot is not None:
+                    prices[slot] = self.prices[old_slot]
+                    updated_at[slot] = self.updated_at[old_slot]
+            self._slots = {symbol: slot for slot, symbol in enumerate(symbols)}
+            self.prices = prices
+            self.updated_at = updated_at
+            self._vectors.clear()
+
+    def track(self, symbols: Iterable[str]):
+        """
+        Add symbols to the tracked set
+        """
+        new_symbols = [symbol for symbol in symbols if symbol not in self._slots]
+        if new_symbols:
+            self.set_symbols([*self._slots, *new_symbols])
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._slots)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._slots
+
+    def slot(self, symbol: str) -> Optional[int]:
+        return self._slots.get(symbol)
+
+    def get(self, symbol: str) -> Optional[float]:
+        with self._mutex:
+            slot = self._slots.get(symbol)
+            if slot is None or np.isnan(self.prices[slot]):
+                return None
+            return float(self.prices[slot])
+
+    def age(self, symbol: str) -> float:
+        """
+        Seconds since the price of a symbol was last updated, infinite if it never was
+        """
+        with self._mutex:
+            slot = self._slots.get(symbol)
+            if slot is None or np.isnan(self.prices[slot]):
+                return float("inf")
+            return time.time() - float(self.updated_at[slot])
+
+    def update(self, symbol: str, price: float, timestamp: float = None) -> bool:
+        """
+        Store the price of a tracked symbol, returns True if it changed
+        """
+        with self._mutex:
+            slot = self._slots.get(symbol)
+            if slot is None:
+                return False
+            self.updated_at[slot] = time.time() if timestamp is None else timestamp
+            if self.prices[slot] == price:
+                return False
+            self.prices[slot] = price
+            return True
+
+    def update_many(self, prices: Dict[str, float], timestamp: float = None):
+        """
+        Store the prices of the tracked symbols among the given ones
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._mutex:
+            for symbol, price in prices.items():
+                slot = self._slots.get(symbol)
+                if slot is not None:
+                    self.prices[slot] = price
+                    self.updated_at[slot] = timestamp
+
+    def _slots_of(self, symbols: Sequence[str]) -> np.ndarray:
+        # Must be called with the mutex held
+        key = tuple(symbols)
+        slots = self._vectors.get(key)
+        if slots is None:
+            untracked = len(self.prices) - 1
+            slots = self._vectors[key] = np.array([self._slots.get(symbol, untracked) for symbol in key], dtype=int)
+        return slots
+
+    def prices_of(self, symbols: Sequence[str]) -> np.ndarray:
+        """
+        Get the prices of the given symbols as a vector, NaN for symbols without a known price
+        """
+        with self._mutex:
+            return self.prices[self._slots_of(symbols)]
+
+    def ages_of(self, symbols: Sequence[str]) -> np.ndarray:
+        """
+        Get the seconds since the prices of the given symbols were last updated, infinite if they never were
+        """
+        with self._mutex:
+            slots = self._slots_of(symbols)
+            ages = time.time() - self.updated_at[slots]
+            ages[np.isnan(self.prices[slots])] = np.inf
+            return ages
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Callable, Dict, Hashable, Optional
+
+from socketio import Client
+from socketio.exceptions import SocketIOError
+
+from .logger import Logger
+
+# Updates of the same row replace each other while they wait to be sent, the dashboard only shows the latest
+UPDATE_KEYS: Dict[str, Callable[[dict], Hashable]] = {
+    "coins": lambda data: data["symbol"],
+    "pairs": lambda data: (data["from_coin"]["symbol"], data["to_coin"]["symbol"]),
+    "scout_history": lambda data: (data["from_coin"]["symbol"], data["to_coin"]["symbol"]),
+    "current_coin_history": lambda data: None,
+    "trade_history": lambda data: data["id"],
+}
+
+
+class ApiConnection:
+    """
+    Socket.io connection to the API server. Failed connection attempts are spaced out exponentially.
+    """
+
+    MIN_BACKOFF = 1
+    MAX_BACKOFF = 60
+
+    def __init__(self, logger: Logger, url: str):
+        self.logger = logger
+        self.url = url
+        self.client = Client()
+        self._backoff = 0
+        self._next_attempt = 0.0
+
+    def connect(self) -> bool:
+        if self.client.connected:
+            return True
+        if time.monotonic() < self._next_attempt:
+            return False
+        try:
+            self.client.connect(self.url, namespaces=["/backend"])
+        except SocketIOError as e:
+            self.failed(f"Could not connect to the API server, retrying in the background: {e}")
+            return False
+        self._backoff = 0
+        return True
+
+    def failed(self, message: str):
+        """
+        Drop the connection and space out the next attempt, `message` is logged on the first failure in a row
+        """
+        if not self._backoff:
+            self.logger.warning(message, False)
+        self._backoff = min(max(self._backoff * 2, self.MIN_BACKOFF), self.MAX_BACKOFF)
+        self._next_attempt = time.monotonic() + self._backoff
+        self.disconnect()
+
+    def disconnect(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+
+class UpdatePublisher:
+    """
+    Sends the database updates to the API server from its own thread, so that the bot never waits on the
+    dashboard. Pending updates are coalesced per table and row and sent in one batch every `interval`
+    seconds. While the API server can't be reached, batches that failed included, they keep coalescing,
+    and updates of new rows are dropped once `max_size` updates are pending. A closed publisher starts
+    again on the next update.
+    """
+
+    # Seconds to wait for the API server to acknowledge a batch
+    SEND_TIMEOUT = 10
+
+    def __init__(self, logger: Logger, interval: float, max_size: int, url="http://api:5123"):
+        self.logger = logger
+        self.interval = interval
+        self.max_size = max_size
+        self.connection = ApiConnection(logger, url)
+        self.dropped = 0
+        self._pending: Dict[str, "OrderedDict[Hashable, dict]"] = {}
+        self._pending_count = 0
+        self._unique_keys = count()
+        self._mutex = threading.Lock()
+        # Stop event of the running thread, each thread gets its own so that a closed publisher can restart
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, table: str, data: dict):
+        key_of = UPDATE_KEYS.get(table)
+        key = key_of(data) if key_of is not None else next(self._unique_keys)
+        with self._mutex:
+            rows = self._pending.setdefault(table, OrderedDict())
+            if key in rows:
+                rows[key] = data
+                rows.move_to_end(key)
+            elif self._pending_count < self.max_size:
+                rows[key] = data
+                self._pending_count += 1
+            else:
+                self.dropped += 1
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+                self._thread.start()
+
+    def _take_pending(self) -> Dict[str, "OrderedDict[Hashable, dict]"]:
+        with self._mutex:
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self.logger.warning(f"Dashboard update queue full, dropped {dropped} updates", False)
+        return pending
+
+    def _restore(self, pending: Dict[str, "OrderedDict[Hashable, dict]"]):
+        """
+        Put back updates that couldn't be sent, the ones published since then are newer and win
+        """
+        with self._mutex:
+            for table, rows in pending.items():
+                newer = self._pending.get(table, OrderedDict())
+                merged = OrderedDict()
+                for key, data in rows.items():
+                    if key in newer:
+                        continue
+                    if self._pending_count < self.max_size:
+                        merged[key] = data
+                        self._pending_count += 1
+                    else:
+                        self.dropped += 1
+                merged.update(newer)
+                self._pending[table] = merged
+
+    def _send(self):
+        with self._mutex:
+            if not self._pending_count:
+                return
+        if not self.connection.connect():
+            return
+        pending = self._take_pending()
+        batch = [{"table": table, "data": list(rows.values())} for table, rows in pending.items() if rows]
+        try:
+            # Waiting for the acknowledgement keeps batches from piling up in the socket, and makes sure the
+            # last one is out before disconnecting
+            self.connection.client.call("updates", batch, namespace="/backend", timeout=self.SEND_TIMEOUT)
+        except SocketIOError as e:
+            self._restore(pending)
+            self.connection.failed(f"Failed to send dashboard updates, retrying in the background: {e}")
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            self._send()
+
+    def close(self):
+        """
+        Send what is pending if the API server is reachable and stop the thread
+        """
+        with self._mutex:
+            thread, self._thread = self._thread, None
+            stop = self._stop
+        if thread is None:
+            return
+        stop.set()
+        thread.join()
+        self._send()
+        self.connection.disconnect()
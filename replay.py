@@ -0,0 +1,40 @@
+import argparse
+import time
+
+from binance_trade_bot.binance_stream_manager import BinanceCache, BinanceStreamManager
+from binance_trade_bot.config import Config
+from binance_trade_bot.logger import Logger
+from binance_trade_bot.stream_recorder import StreamReplayer
+from binance_trade_bot.ticker_store import tracked_symbols
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a stream recording (see stream_record_file) offline")
+    parser.add_argument("path", help="Recording to replay")
+    parser.add_argument("--speed", type=float, default=0, help="Replay speed factor, 0 replays as fast as possible")
+    args = parser.parse_args()
+
+    config = Config()
+    cache = BinanceCache()
+    cache.tickers.set_symbols(tracked_symbols(config.SUPPORTED_COIN_LIST, config.BRIDGE.symbol))
+    stream_manager = BinanceStreamManager(cache, config, None, Logger("replay", False), connect=False)
+    scout_trigger = stream_manager.scout_trigger
+    scout_trigger.watch(coin + config.BRIDGE.symbol for coin in config.SUPPORTED_COIN_LIST)
+
+    scouts = 0
+
+    def process(stream_data):
+        global scouts  # pylint: disable=global-statement
+        stream_manager._process_stream_data(stream_data)  # pylint: disable=protected-access
+        # In event scout mode, every wake up of the trigger results in a scout
+        if scout_trigger.wait(0):
+            scouts += 1
+
+    start = time.monotonic()
+    count = StreamReplayer(args.path).replay(process, args.speed)
+    duration = time.monotonic() - start
+
+    print("EVENTS:", count)
+    print("DURATION:", f"{duration:.3f}s", f"({count / duration if duration else 0:.0f} events/s)")
+    print("SCOUTS:", scouts)
+    prices = {symbol: cache.tickers.get(symbol) for symbol in cache.tickers.symbols}
+    print("PRICES:", {symbol: price for symbol, price in prices.items() if price is not None})
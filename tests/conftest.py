@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+from binance_trade_bot.database import Database
+from binance_trade_bot.models import Coin
+
+
+def pytest_configure(config):  # pylint: disable=redefined-outer-name
+    # The websocket manager's threads end with sys.exit, or crash when the fake exchange closes their
+    # connection, after it is stopped
+    config.addinivalue_line("filterwarnings", "ignore::pytest.PytestUnhandledThreadExceptionWarning")
+
+
+class StubLogger:
+    """
+    Collects the messages instead of writing them to logs/ and sending notifications
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def log(self, message, level="info", notification=True):  # pylint: disable=unused-argument
+        self.messages.append((level, message))
+
+    def info(self, message, notification=True):
+        self.log(message, "info", notification)
+
+    def warning(self, message, notification=True):
+        self.log(message, "warning", notification)
+
+    def error(self, message, notification=True):
+        self.log(message, "error", notification)
+
+    def debug(self, message, notification=False):
+        self.log(message, "debug", notification)
+
+
+@pytest.fixture
+def logger():
+    return StubLogger()
+
+
+@pytest.fixture
+def config():
+    return SimpleNamespace(
+        BRIDGE_SYMBOL="USDT",
+        BRIDGE=Coin("USDT", False),
+        USE_MARGIN="no",
+        SCOUT_MULTIPLIER=5.0,
+        SCOUT_MARGIN=0.8,
+        SCOUT_HISTORY_PRUNE_TIME=1.0,
+        SCOUT_HISTORY_FLUSH_INTERVAL=0.0,
+        SCOUT_HISTORY_BUFFER_SIZE=10000,
+        SCOUT_HISTORY_OVERFLOW="flush",
+        UPDATE_PUBLISH_INTERVAL=1.0,
+        UPDATE_QUEUE_SIZE=1000,
+    )
+
+
+@pytest.fixture
+def make_database(logger, config):  # pylint: disable=redefined-outer-name
+    databases = []
+
+    def make(uri="sqlite://"):
+        database = Database(logger, config, uri)
+        databases.append(database)
+        return database
+
+    yield make
+    for database in databases:
+        database.close()
@@ -0,0 +1,237 @@
+# pylint: disable=protected-access,redefined-outer-name
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from binance_trade_bot import binance_stream_manager
+from binance_trade_bot.binance_stream_manager import (
+    BalanceBook,
+    BinanceCache,
+    BinanceOrder,
+    BinanceStreamManager,
+    OrderStore,
+)
+from binance_trade_bot.ticker_store import TickerStore
+
+
+def make_report(order_id, status="NEW", **fields) -> dict:
+    return {
+        "event_type": "executionReport",
+        "symbol": "ADAUSDT",
+        "side": "BUY",
+        "order_type": "LIMIT",
+        "order_id": order_id,
+        "cumulative_quote_asset_transacted_quantity": "0",
+        "current_order_status": status,
+        "order_price": "1.5",
+        "transaction_time": 1620000000000,
+        **fields,
+    }
+
+
+def make_order(order_id, status="NEW") -> BinanceOrder:
+    return BinanceOrder(make_report(order_id, status))
+
+
+class SlowClient:
+    """
+    REST client whose requests block until `release` is set
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def get_order(self, symbol, orderId):  # pylint: disable=invalid-name
+        self.calls.append("get_order")
+        self.release.wait(5)
+        return {
+            "symbol": symbol,
+            "side": "BUY",
+            "type": "LIMIT",
+            "orderId": orderId,
+            "cummulativeQuoteQty": "0",
+            "status": "NEW",
+            "price": "1.5",
+            "time": 1620000000000,
+        }
+
+    def get_symbol_ticker(self):
+        self.calls.append("get_symbol_ticker")
+        self.release.wait(5)
+        return [{"symbol": "ADAUSDT", "price": "1.6"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(binance_stream_manager.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def stream_manager(logger):
+    cache = BinanceCache()
+    cache.orders = OrderStore(max_size=10, ttl=60)
+    cache.tickers = TickerStore(["ADAUSDT"])
+    manager = BinanceStreamManager(cache, None, SlowClient(), logger, connect=False)
+    manager.bw_api_manager = SimpleNamespace(
+        get_stream_info=lambda stream_id: {"markets": [stream_id]}, stop_manager_with_all_streams=lambda: None
+    )
+    yield manager
+    manager.binance_client.release.set()
+    manager.close()
+
+
+def test_balance_book_snapshot_and_updates():
+    book = BalanceBook()
+    assert book.snapshot() is None
+
+    snapshot = book.load({"ADA": 10.0, "USDT": 5.0}, 100, book.generation)
+    assert snapshot == {"ADA": 10.0, "USDT": 5.0}
+    assert book.snapshot() is snapshot
+
+    assert book.apply_position([("ADA", 12.0), ("USDT", 5.0)], 110) == ["ADA"]
+    assert book.apply_delta("USDT", -2.0, 120)
+    assert book.snapshot() == {"ADA": 12.0, "USDT": 3.0}
+    # Snapshots handed out earlier are never modified
+    assert snapshot == {"ADA": 10.0, "USDT": 5.0}
+    with pytest.raises(TypeError):
+        snapshot["ADA"] = 0.0
+
+
+def test_balance_book_ignores_stale_updates():
+    book = BalanceBook()
+    book.load({"ADA": 10.0}, 100, book.generation)
+    assert book.apply_position([("ADA", 11.0)], 200) == ["ADA"]
+
+    assert not book.apply_position([("ADA", 9.0)], 150)
+    # Already part of the balance set at 200
+    assert book.apply_delta("ADA", 1.0, 200)
+    assert book.snapshot() == {"ADA": 11.0}
+
+
+def test_balance_book_load_keeps_newer_stream_updates():
+    book = BalanceBook()
+    book.load({"ADA": 10.0}, 100, book.generation)
+    book.apply_position([("ADA", 7.0)], 300)
+
+    # A reload fetched before the stream update arrived
+    book.load({"ADA": 10.0, "USDT": 1.0}, 200, book.generation)
+    assert book.snapshot() == {"ADA": 7.0, "USDT": 1.0}
+
+
+def test_balance_book_replays_deltas_received_before_load():
+    book = BalanceBook()
+    generation = book.generation
+    assert book.apply_delta("ADA", 1.0, 90)
+    assert book.apply_delta("ADA", 2.0, 110)
+    assert book.snapshot() is None
+
+    # The delta at 90 is part of the balances fetched at 100, the one at 110 isn't
+    book.load({"ADA": 10.0}, 100, generation)
+    assert book.snapshot() == {"ADA": 12.0}
+
+
+def test_balance_book_invalidation():
+    book = BalanceBook()
+    book.load({"ADA": 1.0}, 100, book.generation)
+
+    # A delta bringing the balance below zero shows that events were missed
+    assert not book.apply_delta("ADA", -2.0, 110)
+    assert book.snapshot() is None
+
+    # Balances fetched before the invalidation are dropped
+    generation = book.generation
+    book.invalidate()
+    assert book.load({"ADA": 5.0}, 120, generation) is None
+    assert book.snapshot() is None
+    assert book.load({"ADA": 5.0}, 120, book.generation) == {"ADA": 5.0}
+
+
+def test_order_store_evicts_least_recently_used(clock):
+    store = OrderStore(max_size=2, ttl=60)
+    store.set(make_order(1))
+    store.set(make_order(2))
+    clock[0] += 1
+    assert store.get(1).id == 1
+
+    store.set(make_order(3))
+    assert store.get(2) is None
+    assert store.get(1) is not None and store.get(3) is not None
+    assert store.stats() == {"size": 2, "pinned": 0, "expired": 0, "evicted": 1}
+
+
+def test_order_store_expires_orders(clock):
+    store = OrderStore(max_size=10, ttl=60)
+    store.set(make_order(1))
+    clock[0] += 30
+    store.set(make_order(2))
+    clock[0] += 31
+
+    store.set(make_order(3))
+    assert store.get(1) is None
+    assert len(store) == 2
+    # Updating an order resets its time to live
+    store.set(make_order(2, "FILLED"))
+    clock[0] += 59
+    store.set(make_order(4))
+    assert store.get(2).status == "FILLED"
+    assert store.stats()["expired"] == 1
+
+
+def test_order_store_keeps_pinned_orders(clock):
+    store = OrderStore(max_size=2, ttl=60)
+    store.pin(1)
+    store.pin(1)
+    store.set(make_order(1))
+    clock[0] += 120
+    store.set(make_order(2))
+    store.set(make_order(3))
+    # The expired order 1 is pinned, so order 2 goes instead
+    assert store.stats() == {"size": 2, "pinned": 1, "expired": 0, "evicted": 1}
+
+    # Pins are counted, the order stays until every waiter is done with it
+    store.unpin(1)
+    store.set(make_order(4))
+    assert store.stats() == {"size": 2, "pinned": 1, "expired": 0, "evicted": 2}
+    store.unpin(1)
+    store.set(make_order(5))
+    assert store.stats() == {"size": 2, "pinned": 0, "expired": 1, "evicted": 2}
+    assert store.get(1) is None
+    assert store.get(4) is not None and store.get(5) is not None
+
+
+def test_reconnect_requests_dont_block_stream_processing(stream_manager):
+    cache = stream_manager.cache
+    stream_manager.pending_orders.add(("ADAUSDT", 1))
+    stream_manager._process_stream_data(make_report(1))
+
+    started = time.monotonic()
+    stream_manager._process_stream_signal("CONNECT", "!userData")
+    stream_manager._process_stream_signal("CONNECT", "adausdt")
+    assert time.monotonic() - started < 1
+
+    # Events keep being processed while the requests are in flight
+    stream_manager._process_stream_data(make_report(1, "FILLED", cumulative_quote_asset_transacted_quantity="15"))
+    assert cache.orders.get(1).status == "FILLED"
+
+    stream_manager.binance_client.release.set()
+    stream_manager._reconciler.submit(lambda: None).result(5)
+    assert stream_manager.binance_client.calls == ["get_order", "get_symbol_ticker"]
+    # The order was updated by the stream while it was fetched, the older state it fetched is dropped
+    assert cache.orders.get(1).status == "FILLED"
+    assert cache.tickers.get("ADAUSDT") == 1.6
+
+
+def test_concurrent_ticker_refreshes_share_one_request(stream_manager):
+    threads = [threading.Thread(target=stream_manager.refresh_tickers) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    stream_manager.binance_client.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert stream_manager.binance_client.calls == ["get_symbol_ticker"]
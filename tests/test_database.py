@@ -0,0 +1,137 @@
+# pylint: disable=protected-access,redefined-outer-name
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from binance_trade_bot.database import Database
+from binance_trade_bot.models import Coin, CoinValue, Interval
+
+# A Monday, weeks are bucketed from Monday on
+START = datetime(2021, 5, 3)
+
+
+def add_values(session, coins, start: datetime, end: datetime):
+    """
+    Add a value of every coin every 15 minutes, at 5 past the quarter
+    """
+    value_time = start + timedelta(minutes=5)
+    while value_time < end:
+        session.add_all(CoinValue(coin, 1.0, 2.0, 3.0, datetime=value_time) for coin in coins)
+        value_time += timedelta(minutes=15)
+
+
+def interval_counts(session):
+    return dict(session.query(CoinValue.interval, func.count()).group_by(CoinValue.interval).all())
+
+
+@pytest.fixture
+def database(make_database):
+    db = make_database()
+    db.create_database()
+    return db
+
+
+def test_pair_store_lookups(database):
+    database.set_coins(["ADA", "XLM", "ETH"])
+    assert {pair.to_coin_id for pair in database.get_pairs_from("ADA")} == {"XLM", "ETH"}
+    assert {pair.from_coin_id for pair in database.get_pairs_to(Coin("ETH"))} == {"ADA", "XLM"}
+    assert len(database.get_pairs()) == 6
+
+    database.set_coins(["ADA", "XLM"])
+    assert [pair.to_coin_id for pair in database.get_pairs_from("ADA")] == ["XLM"]
+    assert {pair.to_coin_id for pair in database.get_pairs_from("ADA", only_enabled=False)} == {"XLM", "ETH"}
+    assert database.get_pairs_to("BTC") == []
+
+
+def test_pair_ratios_are_written_behind(database):
+    database.set_coins(["ADA", "XLM"])
+    pair = database.get_pair("ADA", "XLM")
+    database.set_pair_ratio(pair, 3.5)
+    assert database.get_pairs_from("ADA")[0].ratio == 3.5
+
+    database.flush_pairs()
+    database.barrier()
+    # Reloading the store reads the ratio back from the database
+    database._invalidate_pairs()
+    assert database.get_pair("ADA", "XLM").ratio == 3.5
+
+
+def test_barrier_raises_failed_writes(database, make_database, tmp_path):
+    def fail(_session):
+        raise ValueError("write failed")
+
+    file_database = make_database(f"sqlite:///{tmp_path / 'crypto_trading.db'}")
+    file_database.create_database()
+    # Writes are applied right away on the submitting thread for an in-memory database, by the writer thread
+    # for a database file
+    for db in (database, file_database):
+        db.writer.submit(fail)
+        # A later write succeeding doesn't hide the failure
+        db.writer.submit(lambda _session: None)
+        with pytest.raises(ValueError):
+            db.barrier()
+        # Each failure is only raised once
+        db.barrier()
+
+
+def test_rollup_bucket_counts(database):
+    with database.db_session() as session:
+        coins = [Coin("ADA"), Coin("XLM")]
+        session.add_all(coins)
+        # 9 days of values, and two values of the hour in progress
+        add_values(session, coins, START, START + timedelta(days=9, minutes=30))
+        Database._rollup_value_history(session, START + timedelta(days=9, minutes=30))
+
+        # For each coin: 216 complete hours, 9 days starting in 2 weeks
+        assert interval_counts(session) == {
+            Interval.MINUTELY: 2 * (216 * 3 + 2),
+            Interval.HOURLY: 2 * (216 - 9),
+            Interval.DAILY: 2 * (9 - 2),
+            Interval.WEEKLY: 2 * 2,
+        }
+        weekly = session.query(CoinValue.datetime).filter(CoinValue.interval == Interval.WEEKLY).distinct().all()
+        assert sorted(value_time for (value_time,) in weekly) == [
+            START + timedelta(minutes=5),
+            START + timedelta(days=7, minutes=5),
+        ]
+
+
+def test_rollup_only_looks_at_new_hours(database):
+    with database.db_session() as session:
+        coins = [Coin("ADA")]
+        session.add_all(coins)
+        add_values(session, coins, START, START + timedelta(days=2))
+        Database._rollup_value_history(session, START + timedelta(days=2))
+        before = interval_counts(session)
+        assert before == {Interval.MINUTELY: 48 * 3, Interval.HOURLY: 46, Interval.DAILY: 1, Interval.WEEKLY: 1}
+
+        # Rolling up again before the next hour is complete changes nothing
+        Database._rollup_value_history(session, START + timedelta(days=2, minutes=59))
+        assert interval_counts(session) == before
+
+        # The first value of the third day is promoted, the week already has its first value
+        add_values(session, coins, START + timedelta(days=2), START + timedelta(days=2, hours=3))
+        Database._rollup_value_history(session, START + timedelta(days=2, hours=3))
+        assert interval_counts(session) == {
+            Interval.MINUTELY: 51 * 3,
+            Interval.HOURLY: 48,
+            Interval.DAILY: 2,
+            Interval.WEEKLY: 1,
+        }
+
+
+def test_prune_keeps_rolled_up_values(database):
+    with database.db_session() as session:
+        coins = [Coin("ADA")]
+        session.add_all(coins)
+        add_values(session, coins, START, START + timedelta(days=3))
+        database._prune_value_history(session, START + timedelta(days=3))
+
+        # Minutely values are only kept for the last 24 hours
+        assert interval_counts(session) == {
+            Interval.MINUTELY: 24 * 3,
+            Interval.HOURLY: 72 - 3,
+            Interval.DAILY: 2,
+            Interval.WEEKLY: 1,
+        }
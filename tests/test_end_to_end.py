@@ -0,0 +1,99 @@
+# pylint: disable=redefined-outer-name
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+# pylint: disable=wrong-import-position
+from binance_trade_bot.auto_trader import AutoTrader
+from binance_trade_bot.binance_api_manager import BinanceAPIManager
+from binance_trade_bot.config import Config
+from binance_trade_bot.database import Database
+from binance_trade_bot.fake_exchange import FakeExchange, FakeExchangeSettings
+from binance_trade_bot.models import Trade, TradeState
+
+FILL_DELAY = 0.3
+
+
+def wait_until(condition, timeout=10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@pytest.fixture
+def exchange():
+    settings = FakeExchangeSettings(latency=0.01, fill_delay=FILL_DELAY, fill_parts=3, tick_interval=0.1)
+    fake_exchange = FakeExchange.for_coins(["ADA", "XLM"], "USDT", {"USDT": 10.0, "ADA": 20.0}, settings)
+    fake_exchange.start()
+    yield fake_exchange
+    fake_exchange.stop()
+
+
+@pytest.fixture
+def manager(exchange, logger, tmp_path, monkeypatch):
+    monkeypatch.setenv("API_URL", exchange.api_url)
+    monkeypatch.setenv("STREAM_URL", exchange.stream_url)
+    monkeypatch.setenv("API_KEY", "key")
+    monkeypatch.setenv("API_SECRET_KEY", "secret")
+    monkeypatch.setenv("SUPPORTED_COIN_LIST", "ADA XLM")
+    monkeypatch.setenv("CURRENT_COIN_SYMBOL", "ADA")
+    config = Config()
+    db = Database(logger, config, f"sqlite:///{tmp_path / 'crypto_trading.db'}")
+    db.create_database()
+    binance_manager = BinanceAPIManager(config, db, logger)
+    db.set_coins(config.SUPPORTED_COIN_LIST)
+    db.set_current_coin("ADA")
+    assert wait_until(lambda: binance_manager.get_ticker_price("XLMUSDT") is not None)
+    yield binance_manager
+    binance_manager.stream_manager.close()
+    db.close()
+
+
+def test_jump_through_bridge(manager):
+    trader = AutoTrader(manager, manager.db, manager.logger, manager.config)
+    trader.initialize()
+
+    started = time.monotonic()
+    order = trader.transaction_through_bridge(manager.db.get_pair("ADA", "XLM"))
+    # Both legs waited for their fills, which come in parts after the fill delay
+    assert time.monotonic() - started >= 2 * FILL_DELAY
+    assert order is not None and order.status == "FILLED"
+
+    assert manager.db.get_current_coin().symbol == "XLM"
+    assert manager.get_currency_balance("ADA", force=True) == 0
+    assert manager.get_currency_balance("XLM", force=True) > 0
+    with manager.db.db_session() as session:
+        buy = session.query(Trade).filter(Trade.selling.is_(False)).one()
+        assert buy.state == TradeState.COMPLETE
+        assert 0 < buy.jump_latency < time.monotonic() - started
+
+
+def test_jump_reports_unsaved_current_coin(manager, logger):
+    def fail(_session):
+        raise ValueError("disk I/O error")
+
+    trader = AutoTrader(manager, manager.db, logger, manager.config)
+    trader.initialize()
+    manager.db.writer.submit(fail)
+
+    order = trader.transaction_through_bridge(manager.db.get_pair("ADA", "XLM"))
+    # The coins were traded, but the jump isn't reported as done
+    assert order is not None and order.status == "FILLED"
+    errors = [message for level, message in logger.messages if level == "error"]
+    assert (
+        errors[-1]
+        == "Jumped from [ADA] to [XLM] but couldn't save it, a restart would resume from [ADA]: disk I/O error"
+    )
+    assert not [message for _, message in logger.messages if str(message).startswith("Jump from")]
+
+
+def test_prices_resume_after_reconnect(exchange, manager):
+    exchange.drop_connections()
+    exchange.set_price("ADAUSDT", 123.0)
+    # The tickers are refreshed when the stream is back, and it keeps them up to date afterwards
+    assert wait_until(lambda: abs(manager.get_ticker_price("ADAUSDT") - 123.0) < 1)
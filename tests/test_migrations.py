@@ -0,0 +1,145 @@
+# pylint: disable=redefined-outer-name
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from binance_trade_bot.migrations import SCHEMA_VERSION, get_schema_version
+
+# Schema created by create_all before the database had a version
+BASELINE_SCHEMA = """
+CREATE TABLE coins (
+    symbol VARCHAR NOT NULL,
+    enabled BOOLEAN,
+    PRIMARY KEY (symbol)
+);
+CREATE TABLE coin_value (
+    id INTEGER NOT NULL,
+    coin_id VARCHAR,
+    balance FLOAT,
+    usd_price FLOAT,
+    btc_price FLOAT,
+    interval VARCHAR(8),
+    datetime DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(coin_id) REFERENCES coins (symbol)
+);
+CREATE TABLE current_coin_history (
+    id INTEGER NOT NULL,
+    coin_id VARCHAR,
+    datetime DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(coin_id) REFERENCES coins (symbol)
+);
+CREATE TABLE pairs (
+    id INTEGER NOT NULL,
+    from_coin_id VARCHAR,
+    to_coin_id VARCHAR,
+    ratio FLOAT,
+    PRIMARY KEY (id),
+    FOREIGN KEY(from_coin_id) REFERENCES coins (symbol),
+    FOREIGN KEY(to_coin_id) REFERENCES coins (symbol)
+);
+CREATE TABLE trade_history (
+    id INTEGER NOT NULL,
+    alt_coin_id VARCHAR,
+    crypto_coin_id VARCHAR,
+    selling BOOLEAN,
+    state VARCHAR(8),
+    alt_starting_balance FLOAT,
+    alt_trade_amount FLOAT,
+    crypto_starting_balance FLOAT,
+    crypto_trade_amount FLOAT,
+    datetime DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(alt_coin_id) REFERENCES coins (symbol),
+    FOREIGN KEY(crypto_coin_id) REFERENCES coins (symbol)
+);
+CREATE TABLE scout_history (
+    id INTEGER NOT NULL,
+    pair_id VARCHAR,
+    target_ratio FLOAT,
+    current_coin_price FLOAT,
+    other_coin_price FLOAT,
+    datetime DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(pair_id) REFERENCES pairs (id)
+);
+"""
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = tmp_path / "crypto_trading.db"
+    now = datetime.utcnow()
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany("INSERT INTO coins VALUES (?, ?)", [("ADA", 1), ("XLM", 1), ("ETH", 0)])
+        conn.executemany(
+            "INSERT INTO pairs VALUES (?, ?, ?, ?)",
+            [(1, "ADA", "XLM", 3.6), (2, "XLM", "ADA", 0.27), (3, "ADA", "ETH", 0.0004), (4, "ETH", "ADA", 2500.0)],
+        )
+        conn.executemany(
+            "INSERT INTO scout_history (pair_id, target_ratio, current_coin_price, other_coin_price, datetime) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                ("1", 3.6, 1.5, 0.4, str(now - timedelta(minutes=5))),
+                ("2", 0.27, 0.4, 1.5, str(now - timedelta(minutes=1))),
+                # Past the hour of retention
+                ("1", 3.6, 1.4, 0.4, str(now - timedelta(hours=3))),
+            ],
+        )
+        conn.execute(
+            "INSERT INTO trade_history (alt_coin_id, crypto_coin_id, selling, state, datetime) "
+            "VALUES ('ADA', 'USDT', 0, 'COMPLETE', ?)",
+            (str(now),),
+        )
+    return path
+
+
+def test_upgrade_from_baseline(baseline_db, make_database):
+    db = make_database(f"sqlite:///{baseline_db}")
+    db.create_database()
+
+    with db.engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+
+        trade_columns = {row[1] for row in connection.execute(text("PRAGMA table_info(trade_history)"))}
+        assert "jump_latency" in trade_columns
+        assert connection.execute(text("SELECT count(*) FROM trade_history")).scalar() == 1
+
+        # Pairs are enabled when both of their coins are
+        enabled = dict(connection.execute(text("SELECT id, enabled FROM pairs")).fetchall())
+        assert enabled == {1: 1, 2: 1, 3: 0, 4: 0}
+
+        # The scout history rows within retention moved to the hourly slots, with integer pair ids
+        rows = connection.execute(text("SELECT pair_id, typeof(pair_id) FROM scout_history ORDER BY datetime"))
+        assert rows.fetchall() == [(1, "integer"), (2, "integer")]
+
+        tables = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars().all()
+        assert "scout_history_legacy" not in tables
+        assert "coin_value_rollup" in tables
+
+        indexes = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+        assert {"ix_coin_value_coin_id_datetime", "ix_trade_history_datetime", "ix_pairs_enabled"} <= set(indexes)
+
+
+def test_upgrade_is_only_applied_once(baseline_db, make_database, logger):
+    make_database(f"sqlite:///{baseline_db}").create_database()
+    migrated = [message for _, message in logger.messages if message.startswith("Migrating")]
+    assert len(migrated) == SCHEMA_VERSION
+
+    db = make_database(f"sqlite:///{baseline_db}")
+    db.create_database()
+    assert len([message for _, message in logger.messages if message.startswith("Migrating")]) == SCHEMA_VERSION
+    with db.engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM scout_history")).scalar() == 2
+
+
+def test_new_database_starts_at_latest_version(tmp_path, make_database, logger):
+    db = make_database(f"sqlite:///{tmp_path / 'crypto_trading.db'}")
+    db.create_database()
+    with db.engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+    assert not [message for _, message in logger.messages if message.startswith("Migrating")]
@@ -0,0 +1,117 @@
+# pylint: disable=redefined-outer-name
+import math
+
+import numpy as np
+import pytest
+
+from binance_trade_bot.models import Coin, Pair
+from binance_trade_bot.ratio_engine import RatioEngine
+
+PRICES = {"ADAUSDT": 1.52, "XLMUSDT": 0.41, "ETHUSDT": 3410.0, "DOTUSDT": None}
+SELL_FEES = {"ADA": 0.001, "XLM": 0.00075, "ETH": 0.001, "DOT": 0.001}
+BUY_FEES = {"ADA": 0.00075, "XLM": 0.001, "ETH": 0.00075, "DOT": 0.001}
+RATIOS = {
+    ("ADA", "XLM"): 3.6,
+    ("ADA", "ETH"): 0.00046,
+    ("ADA", "DOT"): 0.05,
+    ("XLM", "ADA"): 0.27,
+    ("XLM", "ETH"): 0.00012,
+    ("ETH", "ADA"): 2200.0,
+    ("ETH", "XLM"): None,
+}
+
+
+def make_pair(from_coin: Coin, to_coin: Coin, ratio) -> Pair:
+    pair = Pair(from_coin, to_coin, ratio)
+    # Set by the database when the pair is loaded from it
+    pair.from_coin_id = from_coin.symbol
+    pair.to_coin_id = to_coin.symbol
+    return pair
+
+
+def get_prices(symbols):
+    return np.array([PRICES[symbol] or np.nan for symbol in symbols])
+
+
+def get_fee(coin: Coin, _bridge: Coin, selling: bool) -> float:
+    return (SELL_FEES if selling else BUY_FEES)[coin.symbol]
+
+
+def baseline_ratio(config, pair: Pair, coin_price: float) -> float:
+    """
+    Scouting ratio of one pair as AutoTrader._get_ratios computed it before the engine
+    """
+    optional_coin_price = PRICES[pair.to_coin.symbol + config.BRIDGE.symbol]
+    coin_opt_coin_ratio = coin_price / optional_coin_price
+    from_fee = get_fee(pair.from_coin, config.BRIDGE, True)
+    to_fee = get_fee(pair.to_coin, config.BRIDGE, False)
+    transaction_fee = from_fee + to_fee - from_fee * to_fee
+    if config.USE_MARGIN == "yes":
+        return (1 - transaction_fee) * coin_opt_coin_ratio / pair.ratio - 1 - config.SCOUT_MARGIN / 100
+    return (coin_opt_coin_ratio - transaction_fee * config.SCOUT_MULTIPLIER * coin_opt_coin_ratio) - pair.ratio
+
+
+@pytest.fixture
+def engine(config):
+    coins = {symbol: Coin(symbol) for symbol in ("ADA", "XLM", "ETH", "DOT")}
+    pairs = [
+        make_pair(coins[from_symbol], coins[to_symbol], ratio) for (from_symbol, to_symbol), ratio in RATIOS.items()
+    ]
+    ratio_engine = RatioEngine(config)
+    ratio_engine.load(list(coins.values()), pairs)
+    ratio_engine.update_prices(get_prices)
+    ratio_engine.update_fees(get_fee, list(coins))
+    return ratio_engine
+
+
+@pytest.mark.parametrize("use_margin", ["no", "yes"])
+def test_scout_from_matches_baseline(engine, config, use_margin):
+    config.USE_MARGIN = use_margin
+    for symbol in ("ADA", "XLM", "ETH"):
+        # The engine keeps the price it is given for the current coin
+        engine.update_prices(get_prices)
+        coin_price = PRICES[symbol + "USDT"] * 1.01
+        ratios = engine.scout_from(symbol, coin_price)
+        for j, pair in engine.pairs_from(symbol):
+            optional_coin_price = PRICES[pair.to_coin.symbol + "USDT"]
+            if optional_coin_price is None or pair.ratio is None:
+                assert math.isnan(ratios[j])
+            else:
+                assert ratios[j] == pytest.approx(baseline_ratio(config, pair, coin_price), rel=1e-12)
+
+
+def test_scout_all_matches_scout_from(engine):
+    matrix = engine.scout_all()
+    for symbol, i in engine.index.items():
+        np.testing.assert_array_equal(matrix[i], engine.scout_from(symbol))
+    # Coins are never scouted against themselves
+    assert np.isnan(np.diag(matrix)).all()
+
+
+def test_missing_values_give_nan(engine):
+    ratios = engine.scout_from("ADA")
+    # No bridge market for DOT
+    assert math.isnan(ratios[engine.index["DOT"]])
+    # No target ratio from ETH to XLM yet
+    assert math.isnan(engine.scout_from("ETH")[engine.index["XLM"]])
+    # No pair from XLM to DOT
+    assert math.isnan(engine.scout_from("XLM")[engine.index["DOT"]])
+
+
+def test_set_ratio_updates_matrix_and_pair(engine):
+    engine.set_ratio("ETH", "XLM", 8000.0)
+    i, j = engine.index["ETH"], engine.index["XLM"]
+    assert engine.ratios[i, j] == 8000.0
+    assert engine.pairs[(i, j)].ratio == 8000.0
+    assert not math.isnan(engine.scout_from("ETH")[j])
+
+
+def test_best_pair(engine):
+    ratios = engine.scout_from("ADA")
+    assert engine.best_pair("ADA", np.full_like(ratios, -1.0)) is None
+
+    ratios = np.full_like(ratios, np.nan)
+    ratios[engine.index["XLM"]] = 0.1
+    ratios[engine.index["ETH"]] = 0.2
+    best = engine.best_pair("ADA", ratios)
+    assert (best.from_coin_id, best.to_coin_id) == ("ADA", "ETH")
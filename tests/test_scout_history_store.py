@@ -0,0 +1,92 @@
+# pylint: disable=protected-access,redefined-outer-name
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from binance_trade_bot.scout_history_store import ScoutHistoryStore
+
+START = datetime(2021, 5, 1)
+# Hours since the epoch, a multiple of 3 so that hour h of the tests goes to slot h % 3
+START_HOUR = 449952
+
+
+def make_rows(hour: int, count: int = 2):
+    return [
+        {
+            "pair_id": 1,
+            "target_ratio": 1.0,
+            "current_coin_price": float(hour),
+            "other_coin_price": 1.0,
+            "datetime": START + timedelta(hours=hour, minutes=10 * i),
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def connection():
+    with create_engine("sqlite://").begin() as conn:
+        yield conn
+
+
+@pytest.fixture
+def store(connection, logger):
+    scout_history_store = ScoutHistoryStore(2, logger)
+    scout_history_store.create(connection)
+    return scout_history_store
+
+
+def slot_rows(connection, store, slot):
+    return connection.execute(select(store.slots[slot].c.current_coin_price)).scalars().all()
+
+
+def test_slots_cover_retention(store, connection):
+    assert store.slot_count == 3
+    assert store._get_slot_hours(connection) == {0: None, 1: None, 2: None}
+
+
+def test_rows_go_to_the_slot_of_their_hour(store, connection):
+    store.insert(connection, make_rows(0) + make_rows(1) + make_rows(2, 3))
+    assert slot_rows(connection, store, 0) == [0.0, 0.0]
+    assert slot_rows(connection, store, 1) == [1.0, 1.0]
+    assert slot_rows(connection, store, 2) == [2.0, 2.0, 2.0]
+    assert connection.execute(text("SELECT count(*) FROM scout_history")).scalar() == 7
+    # The view's ids stay unique across slots
+    assert connection.execute(text("SELECT count(DISTINCT id) FROM scout_history")).scalar() == 7
+
+
+def test_ring_reuses_slots_of_expired_hours(store, connection):
+    store.insert(connection, make_rows(0) + make_rows(1) + make_rows(2))
+    store.insert(connection, make_rows(3, 1))
+    # Hour 3 took over the slot of hour 0
+    assert slot_rows(connection, store, 0) == [3.0]
+    assert store._get_slot_hours(connection)[0] == START_HOUR + 3
+
+    # Rows of an hour whose slot already moved on are past retention
+    store.insert(connection, make_rows(0))
+    assert slot_rows(connection, store, 0) == [3.0]
+
+    # Later rows of the same hour are added to its slot
+    store.insert(connection, make_rows(3, 1))
+    assert slot_rows(connection, store, 0) == [3.0, 3.0]
+
+
+def test_prune_empties_expired_slots(store, connection):
+    store.insert(connection, make_rows(0) + make_rows(1) + make_rows(2))
+    # Hour 0 ended 2 hours before 03:00, hour 1 only ends 2 hours before 04:00
+    store.prune(connection, START + timedelta(hours=3))
+    assert slot_rows(connection, store, 0) == []
+    assert slot_rows(connection, store, 1) == [1.0, 1.0]
+    hours = store._get_slot_hours(connection)
+    assert hours[0] is None and hours[1] == START_HOUR + 1
+
+
+def test_retention_change_rebuilds_the_ring(store, connection, logger):
+    store.insert(connection, make_rows(0))
+    larger = ScoutHistoryStore(4, logger)
+    larger.create(connection)
+    assert larger.slot_count == 5
+    assert connection.execute(text("SELECT count(*) FROM scout_history")).scalar() == 0
+    tables = connection.execute(text("SELECT name FROM sqlite_master WHERE name LIKE 'scout_history_%'")).scalars()
+    assert sorted(tables) == sorted([f"scout_history_{slot}" for slot in range(5)] + ["scout_history_slots"])
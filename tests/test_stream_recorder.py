@@ -0,0 +1,33 @@
+import time
+
+from binance_trade_bot.stream_recorder import StreamRecorder, StreamReplayer
+
+
+def test_recorder_flushes_a_quiet_stream(tmp_path, monkeypatch):
+    monkeypatch.setattr(StreamRecorder, "FLUSH_INTERVAL", 0.05)
+    path = str(tmp_path / "stream.gz")
+    recorder = StreamRecorder(path)
+    try:
+        recorder.record(1620000000.0, {"event_type": "bookTicker", "symbol": "ADAUSDT"})
+        recorder.record(1620000001.0, {"event_type": "outboundAccountPosition"})
+        # No other event comes in, the buffered one is written anyway
+        deadline = time.monotonic() + 5
+        while not list(StreamReplayer(path)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert list(StreamReplayer(path)) == [(1620000000.0, {"event_type": "bookTicker", "symbol": "ADAUSDT"})]
+    finally:
+        recorder.close()
+
+
+def test_recorder_cuts_off_truncated_member(tmp_path):
+    path = str(tmp_path / "stream.gz")
+    recorder = StreamRecorder(path)
+    recorder.record(1.0, {"event_type": "bookTicker"})
+    recorder.close()
+    with open(path, "ab") as f:
+        f.write(b"\x1f\x8b\x08\x00")
+
+    recorder = StreamRecorder(path)
+    recorder.record(2.0, {"event_type": "executionReport"})
+    recorder.close()
+    assert [received_at for received_at, _ in StreamReplayer(path)] == [1.0, 2.0]
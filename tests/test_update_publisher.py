@@ -0,0 +1,92 @@
+# pylint: disable=protected-access
+import time
+
+from socketio.exceptions import SocketIOError
+
+from binance_trade_bot.update_publisher import UpdatePublisher
+
+
+class StubConnection:
+    """
+    Connection whose sends fail while `failing` is set, recording the batches it sends otherwise
+    """
+
+    def __init__(self):
+        self.client = self
+        self.failing = False
+        self.failures = 0
+        self.batches = []
+        # Called while a batch is being sent
+        self.on_call = lambda: None
+
+    def connect(self):
+        return True
+
+    def failed(self, _message):
+        self.failures += 1
+
+    def disconnect(self):
+        pass
+
+    def call(self, _event, batch, **_kwargs):
+        self.on_call()
+        if self.failing:
+            raise SocketIOError("connection lost")
+        self.batches.append(batch)
+
+
+def make_publisher(logger, max_size=1000, interval=60.0) -> UpdatePublisher:
+    publisher = UpdatePublisher(logger, interval, max_size)
+    publisher.connection = StubConnection()
+    return publisher
+
+
+def coin(symbol: str, balance: float) -> dict:
+    return {"symbol": symbol, "balance": balance}
+
+
+def test_failed_batch_is_sent_again(logger):
+    publisher = make_publisher(logger)
+    publisher.connection.failing = True
+    publisher.publish("coins", coin("ADA", 1.0))
+    publisher.publish("coins", coin("XLM", 1.0))
+    publisher._send()
+    assert publisher.connection.failures == 1
+
+    # Updates published after the failed send replace the ones it put back
+    publisher.publish("coins", coin("ADA", 2.0))
+    publisher.connection.failing = False
+    publisher._send()
+    assert publisher.connection.batches == [[{"table": "coins", "data": [coin("XLM", 1.0), coin("ADA", 2.0)]}]]
+    publisher.close()
+
+
+def test_failed_batch_respects_max_size(logger):
+    publisher = make_publisher(logger, max_size=2)
+    publisher.connection.failing = True
+    publisher.publish("coins", coin("ADA", 1.0))
+    publisher.publish("coins", coin("XLM", 1.0))
+    # Published while the batch is in flight, there is only room left for one of the updates put back
+    publisher.connection.on_call = lambda: publisher.publish("coins", coin("ETH", 1.0))
+    publisher._send()
+
+    publisher.connection.on_call = lambda: None
+    publisher.connection.failing = False
+    publisher._send()
+    assert publisher.connection.batches == [[{"table": "coins", "data": [coin("ADA", 1.0), coin("ETH", 1.0)]}]]
+    assert ("warning", "Dashboard update queue full, dropped 1 updates") in logger.messages
+    publisher.close()
+
+
+def test_closed_publisher_restarts(logger):
+    publisher = make_publisher(logger, interval=0.01)
+    publisher.publish("coins", coin("ADA", 1.0))
+    publisher.close()
+    assert len(publisher.connection.batches) == 1
+
+    publisher.publish("coins", coin("ADA", 2.0))
+    deadline = time.monotonic() + 5
+    while len(publisher.connection.batches) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert publisher.connection.batches[1] == [{"table": "coins", "data": [coin("ADA", 2.0)]}]
+    publisher.close()